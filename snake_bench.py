@@ -0,0 +1,446 @@
+# ==============================================================================
+# GROUP MEMBERS: Adrian R., Christian V., Kamy A. and Vanessa F.
+# ASGT: Project
+# ORGN: CMPS 3640
+# FILE: snake_bench.py
+# DATE:
+# DESCRIPTION: Performance benchmarks for the simulation, the drawing code and
+#              the state send / receive path, across snake lengths. Runs
+#              without a display (SDL dummy video driver). Results are
+#              written as JSON and compared against a stored baseline, so a
+#              change that slows down the game loop gets flagged.
+#
+#              python3 snake_bench.py                    (run, compare to baseline)
+#              python3 snake_bench.py --save-baseline    (store this run as the baseline)
+#              python3 snake_bench.py --only render --out results.json
+# ==============================================================================
+
+# === Libraries ===
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+# NO WINDOW / SOUND NEEDED; MUST BE SET BEFORE PYGAME STARTS
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import pygame
+
+import snake_p2p_simple as snake_game
+from snake_engine import GameState, Occupancy, Snake, MOVES, STATE_RUNNING
+from snake_protocol import DeltaEncoder, KEYFRAME_INTERVAL
+
+# === Settings ===
+LENGTHS = (4, 100, 1000, 10000)  # SNAKE LENGTHS (SEGMENTS) THE LENGTH-DEPENDENT CASES RUN AT
+BENCH_COLS = 160  # ARENA IN CELLS: ROOM FOR 10,000 SEGMENTS PLUS ONE CYCLE OF MOVES
+BENCH_ROWS = 120
+CYCLE_TICKS = KEYFRAME_INTERVAL  # MOVES BEFORE A MOVING SNAKE IS PUT BACK (ONE KEYFRAME PER CYCLE)
+MIN_SAMPLE_TIME = 0.1  # SECONDS PER SAMPLE
+REPEAT = 5  # SAMPLES PER CASE; THEIR MEDIAN IS WHAT GETS COMPARED
+TOLERANCE = 0.25  # SLOWER THAN THE BASELINE BY MORE THAN THIS FRACTION = REGRESSION
+BASELINE_FILE = "bench_baseline.json"
+RESULTS_VERSION = 1  # BUMP WHEN THE RESULTS FILE LAYOUT CHANGES
+
+
+# === Bench Setup ===
+def serpentine(length):
+    """Body (head first) of a `length` segment snake laid back and forth across
+    the top rows of the bench arena, head on the lowest row, so it can move
+    DOWN for CYCLE_TICKS ticks without running into anything."""
+    cell = snake_game.CELL
+    cols = range(1, BENCH_COLS - 1)
+    cells = []
+    row = 1
+    while len(cells) < length:
+        for col in (cols if row % 2 else reversed(cols)):
+            cells.append((col * cell, row * cell))
+            if len(cells) == length:
+                break
+        row += 1
+    if row + CYCLE_TICKS >= BENCH_ROWS - 2:
+        raise ValueError(f"a {length} segment snake does not fit the bench arena")
+    cells.reverse()
+    return cells
+
+
+def bench_game(length, long_player=2):
+    """A running two-snake match: `long_player` has the long snake heading DOWN,
+    the other a short one heading LEFT along the bottom, out of its way.
+    Returns (game, restart); restart() puts both snakes back."""
+    cell = snake_game.CELL
+    game = GameState(BENCH_COLS * cell, BENCH_ROWS * cell, cell, 2)
+    long_body = serpentine(length)
+    short_body = [((100 + i) * cell, (BENCH_ROWS - 2) * cell) for i in range(4)]
+
+    def restart():
+        for snake in game.snakes:
+            if snake.player == long_player:
+                snake.set_body(long_body)
+                snake.direction = snake.change_to = 'DOWN'
+            else:
+                snake.set_body(short_body)
+                snake.direction = snake.change_to = 'LEFT'
+            snake.alive = True
+        game.fruit_pos = (0, 0)  # IN THE WALL: NEVER EATEN, SO NEVER RESPAWNED
+        game.fruit_spawn = True
+        game.phase = STATE_RUNNING
+
+    restart()
+    return game, restart
+
+
+def use_game(game, player=2):
+    """Point the game module at `game`, playing as `player` with no network session."""
+    snake_game.world_width = game.width
+    snake_game.world_height = game.height
+    snake_game.game = game
+    snake_game.prev_bodies = [[] for _ in game.snakes]
+    snake_game.snake_views.clear()
+    snake_game.local_player = player
+    snake_game.is_host = player == 1
+    snake_game.peer_connected = False
+    snake_game.peer_senders.clear()
+    snake_game.remote_predictors.clear()
+    snake_game.remote_states = []
+    snake_game.relay_frames = []
+    snake_game.state_encoder = None
+    snake_game.recorder = None
+    snake_game.update_camera()
+
+
+def step_snake(snake):
+    """Move snake one cell DOWN with no game rules (sender side of a stream)."""
+    dx, dy = MOVES['DOWN']
+    x, y = snake.pos
+    snake.push_head((x + dx * snake.grid.cell, y + dy * snake.grid.cell))
+    snake.pop_tail()
+
+
+def check_running(game):
+    if game.phase != STATE_RUNNING:
+        raise RuntimeError("bench match ended early; the timings would be meaningless")
+
+
+# === Cases ===
+# EACH CASE TAKES A SNAKE LENGTH (None FOR THE ONES THAT DO NOT DEPEND ON IT) AND
+# RETURNS run(count) -> (SECONDS, OPERATIONS), TIMING ONLY THE CODE UNDER TEST
+def sim_step(length):
+    """GameState.step(): movement, fruit check and collisions for both snakes."""
+    game, restart = bench_game(length)
+
+    def run(count):
+        elapsed = 0.0
+        for _ in range(count):
+            restart()
+            start = time.perf_counter()
+            for _ in range(CYCLE_TICKS):
+                game.step()
+            elapsed += time.perf_counter() - start
+            check_running(game)
+        return elapsed, count * CYCLE_TICKS
+    return run
+
+
+def sim_collisions(length):
+    """GameState.check_collisions() alone."""
+    game, _ = bench_game(length)
+    check = game.check_collisions
+
+    def run(count):
+        start = time.perf_counter()
+        for _ in range(count):
+            check()
+        elapsed = time.perf_counter() - start
+        check_running(game)
+        return elapsed, count
+    return run
+
+
+def repeat_call(func, *args):
+    """run() for a case that just calls func(*args) over and over."""
+    def run(count):
+        start = time.perf_counter()
+        for _ in range(count):
+            func(*args)
+        return time.perf_counter() - start, count
+    return run
+
+
+def render_background(length):
+    """draw_background(): the cached stripes + grid layer."""
+    use_game(bench_game(4)[0])
+    return repeat_call(snake_game.draw_background, snake_game.screen)
+
+
+def render_snake(length):
+    """draw_snake_view() for the long snake, camera on its head (a frame between ticks)."""
+    game, _ = bench_game(length)
+    use_game(game)
+    fill, outline = snake_game.PLAYER_COLORS[1]
+    snake_game.sync_snake_views()
+    view = snake_game.snake_views[1]
+    return repeat_call(snake_game.draw_snake_view, snake_game.screen, view, [], 1.0, fill, outline)
+
+
+def render_snake_moving(length):
+    """The long snake's share of the first frame after a tick: move it, follow
+    it with the camera, sync its SnakeView and draw it."""
+    game, restart = bench_game(length)
+    use_game(game)
+    fill, outline = snake_game.PLAYER_COLORS[1]
+    snake = game.snake(2)
+    screen = snake_game.screen
+
+    def run(count):
+        elapsed = 0.0
+        for _ in range(count):
+            restart()
+            snake_game.update_camera()
+            snake_game.sync_snake_views()  # THE NEW BODY IS COPIED ONCE, LIKE AFTER A RESET
+            view = snake_game.snake_views[1]
+            start = time.perf_counter()
+            for _ in range(CYCLE_TICKS):
+                step_snake(snake)
+                snake_game.update_camera()
+                snake_game.sync_snake_views()
+                snake_game.draw_snake_view(screen, view, [], 1.0, fill, outline)
+            elapsed += time.perf_counter() - start
+        return elapsed, count * CYCLE_TICKS
+    return run
+
+
+def render_dirty(length):
+    """DirtyRenderer.render() on a frame between ticks (nothing moved but the fruit)."""
+    game, _ = bench_game(length)
+    use_game(game)
+    renderer = snake_game.DirtyRenderer()
+    renderer.render(snake_game.screen)  # THE FIRST FRAME IS A FULL REPAINT
+    return repeat_call(renderer.render, snake_game.screen)
+
+
+def render_fruit(length):
+    """draw_fruit() with the fruit in view."""
+    game, _ = bench_game(4)
+    use_game(game)
+    cell = snake_game.CELL
+    pos = (snake_game.camera.x + 10 * cell, snake_game.camera.y + 10 * cell)
+    return repeat_call(snake_game.draw_fruit, snake_game.screen, pos)
+
+
+def render_hud(length):
+    """Every HUD label (title, scores, connection status, controls) plus overlays."""
+    use_game(bench_game(4)[0])
+    screen = snake_game.screen
+
+    def draw_hud():
+        snake_game.blit_labels(screen, snake_game.hud_labels())
+        snake_game.draw_overlays(screen)
+    return repeat_call(draw_hud)
+
+
+def render_frame(length):
+    """draw_scene(): one whole game frame."""
+    game, _ = bench_game(length)
+    use_game(game)
+    return repeat_call(snake_game.draw_scene, snake_game.screen)
+
+
+def net_send(length):
+    """send_game_state() for the long snake as it moves: a delta per tick and a
+    keyframe every KEYFRAME_INTERVAL ticks, handed to the link to the host."""
+    game, restart = bench_game(length)
+    use_game(game, player=2)
+    link = snake_game.PeerLink(1)  # NEVER CONNECTED: flush() WRITES NOTHING
+    snake_game.peer_senders[1] = link
+    snake_game.peer_connected = True
+    snake_game.state_encoder = DeltaEncoder(2)
+    snake = game.snake(2)
+
+    def run(count):
+        elapsed = 0.0
+        for _ in range(count):
+            restart()
+            snake_game.state_encoder.request_keyframe()
+            for _ in range(CYCLE_TICKS):
+                start = time.perf_counter()
+                snake_game.send_game_state()
+                elapsed += time.perf_counter() - start
+                link.state = None  # AS IF IT WAS WRITTEN
+                step_snake(snake)
+        return elapsed, count * CYCLE_TICKS
+    return run
+
+
+def net_receive(length):
+    """A host's state stream for its long snake (a keyframe, then deltas) read
+    by a client: frames parsed off the link's receive buffer and queued, then
+    drained and applied to the remote snake by update_remote_snake()."""
+    game, restart = bench_game(length, long_player=1)
+    use_game(game, player=2)
+    link = snake_game.PeerLink(1)
+
+    # THE STREAM THE HOST WOULD SEND FOR ONE CYCLE
+    sender = Snake(1, Occupancy(game.width, game.height, game.cell))
+    sender.set_state(game.snake(1).body, 'DOWN', 0)
+    encoder = DeltaEncoder(1)
+    frames = []
+    for _ in range(CYCLE_TICKS):
+        state = encoder.encode(sender)
+        state['fruit_pos'] = game.fruit_pos
+        frames.append(snake_game.codec.encode(state))
+        step_snake(sender)
+
+    def run(count):
+        elapsed = 0.0
+        for _ in range(count):
+            restart()
+            predictor = snake_game.remote_predictors.get(1)
+            if predictor:
+                predictor.decoder.seq = None  # THE STREAM STARTS OVER AT ITS KEYFRAME
+            for frame in frames:
+                start = time.perf_counter()
+                size = len(frame)
+                link.get_buffer(size)[:size] = frame
+                link.buffer_updated(size)
+                snake_game.drain_inbound()
+                snake_game.update_remote_snake()
+                elapsed += time.perf_counter() - start
+        check_running(game)
+        return elapsed, count * CYCLE_TICKS
+    return run
+
+
+# (NAME, CASE, RUNS AT EVERY LENGTH)
+CASES = [
+    ('sim.step', sim_step, True),
+    ('sim.collisions', sim_collisions, True),
+    ('render.background', render_background, False),
+    ('render.snake', render_snake, True),
+    ('render.snake_moving', render_snake_moving, True),
+    ('render.dirty', render_dirty, True),
+    ('render.fruit', render_fruit, False),
+    ('render.hud', render_hud, False),
+    ('render.frame', render_frame, True),
+    ('net.send', net_send, True),
+    ('net.receive', net_receive, True),
+]
+
+
+# === Running + Comparing ===
+def measure(run, min_time=MIN_SAMPLE_TIME, repeat=REPEAT):
+    """Per-operation times (seconds) of `repeat` samples, each at least min_time long."""
+    count = 1
+    while True:
+        elapsed, ops = run(count)
+        if elapsed >= min_time:
+            break
+        # AIM A LITTLE PAST min_time, AT MOST 10x MORE PER ROUND
+        count = max(count + 1, int(count * min(10.0, 1.2 * min_time / max(elapsed, 1e-9))))
+    samples = [elapsed / ops]
+    for _ in range(repeat - 1):
+        elapsed, ops = run(count)
+        samples.append(elapsed / ops)
+    return samples
+
+
+def result_key(name, length):
+    return name if length is None else f"{name}[{length}]"
+
+
+def run_cases(lengths=LENGTHS, only=(), min_time=MIN_SAMPLE_TIME, repeat=REPEAT):
+    """Run every case (whose name starts with one of `only`, if given); returns the results document."""
+    results = {}
+    for name, case, per_length in CASES:
+        if only and not name.startswith(tuple(only)):
+            continue
+        for length in (lengths if per_length else (None,)):
+            samples = measure(case(length), min_time, repeat)
+            results[result_key(name, length)] = {
+                'case': name, 'length': length,
+                'median_us': statistics.median(samples) * 1e6,
+                'min_us': min(samples) * 1e6,
+                'samples_us': [sample * 1e6 for sample in samples],
+            }
+            print(f"  {result_key(name, length):<26} {results[result_key(name, length)]['median_us']:12.2f} us",
+                  file=sys.stderr, flush=True)
+    return {
+        'type': 'snake_bench', 'version': RESULTS_VERSION, 'created': time.time(),
+        'python': platform.python_version(), 'pygame': pygame.version.ver,
+        'platform': platform.platform(), 'machine': platform.machine(),
+        'settings': {'min_sample_time': min_time, 'repeat': repeat, 'cell': snake_game.CELL,
+                     'window': [snake_game.screen_width, snake_game.screen_height],
+                     'arena': [BENCH_COLS, BENCH_ROWS], 'wire_format': snake_game.WIRE_FORMAT},
+        'results': results,
+    }
+
+
+def compare(current, baseline, tolerance=TOLERANCE):
+    """One row per result: (key, baseline us or None, current us, change, regressed)."""
+    rows = []
+    base_results = baseline.get('results', {}) if baseline else {}
+    for key, result in current['results'].items():
+        base = base_results.get(key)
+        now = result['median_us']
+        if base is None:
+            rows.append((key, None, now, None, False))
+            continue
+        change = now / base['median_us'] - 1.0
+        rows.append((key, base['median_us'], now, change, change > tolerance))
+    return rows
+
+
+def print_table(rows, tolerance):
+    print(f"{'case':<26} {'baseline us':>12} {'now us':>12} {'change':>8}")
+    for key, base, now, change, regressed in rows:
+        base_text = f"{base:12.2f}" if base is not None else f"{'-':>12}"
+        change_text = f"{change:+8.1%}" if change is not None else f"{'new':>8}"
+        print(f"{key:<26} {base_text} {now:12.2f} {change_text}{'  REGRESSION' if regressed else ''}")
+    regressions = sum(1 for row in rows if row[4])
+    if regressions:
+        print(f"{regressions} case(s) more than {tolerance:.0%} slower than the baseline")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the snake game's simulation, drawing and networking.")
+    parser.add_argument('--lengths', default=','.join(map(str, LENGTHS)),
+                        help="comma-separated snake lengths (default: %(default)s)")
+    parser.add_argument('--only', action='append', default=[],
+                        help="only cases whose name starts with this (e.g. sim, render.snake); repeatable")
+    parser.add_argument('--min-time', type=float, default=MIN_SAMPLE_TIME, help="seconds per sample")
+    parser.add_argument('--repeat', type=int, default=REPEAT, help="samples per case")
+    parser.add_argument('--out', help="write the results as JSON to this file")
+    parser.add_argument('--baseline', default=BASELINE_FILE,
+                        help="baseline results to compare with (default: %(default)s, if it exists)")
+    parser.add_argument('--save-baseline', action='store_true', help="store this run as the baseline")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help="allowed slowdown before a case counts as a regression (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    lengths = [int(length) for length in args.lengths.split(',') if length]
+    current = run_cases(lengths, args.only, args.min_time, args.repeat)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(current, f, indent=1)
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    rows = compare(current, baseline, args.tolerance)
+    print_table(rows, args.tolerance)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(current, f, indent=1)
+        print(f"Saved baseline to {args.baseline}")
+    # NON-ZERO EXIT ON A REGRESSION, SO CI CAN FAIL THE BUILD
+    return 1 if any(row[4] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
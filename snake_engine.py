@@ -0,0 +1,372 @@
+# ==============================================================================
+# GROUP MEMBERS: Adrian R., Christian V., Kamy A. and Vanessa F.
+# ASGT: Project
+# ORGN: CMPS 3640
+# FILE: snake_engine.py
+# DATE:
+# DESCRIPTION: Headless versus-snake simulation (movement, fruit, collisions).
+#              No pygame / display dependency, so matches can be simulated
+#              on machines without a screen.
+# ==============================================================================
+
+# === Libraries ===
+import random
+from collections import deque
+
+# Game state constants
+STATE_COUNTDOWN = "COUNTDOWN"
+STATE_RUNNING = "RUNNING"
+STATE_PAUSED = "PAUSED"
+STATE_GAME_OVER = "GAME_OVER"
+
+# Directions
+DIRECTIONS = ('UP', 'DOWN', 'LEFT', 'RIGHT')
+OPPOSITE = {'UP': 'DOWN', 'DOWN': 'UP', 'LEFT': 'RIGHT', 'RIGHT': 'LEFT'}
+MOVES = {'UP': (0, -1), 'DOWN': (0, 1), 'LEFT': (-1, 0), 'RIGHT': (1, 0)}
+
+START_LENGTH = 4  # segments per snake after a reset
+FRUIT_POINTS = 10
+
+
+class FreeCells:
+    """Set of flat cell indices with O(1) add, discard and uniform sampling.
+
+    The members live in a plain list; `slots` maps each index to its place
+    in that list (-1 = not a member), so a discard swaps the last member
+    into the hole instead of shifting everything after it.
+    """
+
+    __slots__ = ('cells', 'slots')
+
+    def __init__(self, size, members=()):
+        self.cells = []
+        self.slots = [-1] * size
+        for i in members:
+            self.add(i)
+
+    def __len__(self):
+        return len(self.cells)
+
+    def __contains__(self, i):
+        return self.slots[i] >= 0
+
+    def add(self, i):
+        if self.slots[i] < 0:
+            self.slots[i] = len(self.cells)
+            self.cells.append(i)
+
+    def discard(self, i):
+        slot = self.slots[i]
+        if slot >= 0:
+            last = self.cells.pop()
+            if last != i:
+                self.cells[slot] = last
+                self.slots[last] = slot
+            self.slots[i] = -1
+
+    def sample(self, rng):
+        """A uniformly random member, or None if the set is empty."""
+        return rng.choice(self.cells) if self.cells else None
+
+
+class Occupancy:
+    """Per-cell segment counts for the whole board, in one bytearray.
+
+    Snakes update it as their heads advance and tails retract, so asking
+    "is anything else in this cell?" is O(1) no matter how long they are.
+    Positions off the board are never stored. `free` tracks the empty cells
+    a fruit may use, i.e. every cell except the `blocked` ones (walls, HUD).
+    """
+
+    __slots__ = ('cell', 'cols', 'rows', 'counts', 'blocked', 'free')
+
+    def __init__(self, width, height, cell, blocked=()):
+        self.cell = cell
+        self.cols = width // cell
+        self.rows = height // cell
+        self.counts = bytearray(self.cols * self.rows)
+        self.blocked = bytearray(self.cols * self.rows)
+        for i in blocked:
+            self.blocked[i] = 1
+        self.free = FreeCells(len(self.counts),
+                              (i for i, b in enumerate(self.blocked) if not b))
+
+    def index(self, pos):
+        """Flat cell index for a pixel position, or -1 if it is off the board."""
+        cx = pos[0] // self.cell
+        cy = pos[1] // self.cell
+        if 0 <= cx < self.cols and 0 <= cy < self.rows:
+            return cy * self.cols + cx
+        return -1
+
+    def position(self, i):
+        """Pixel position of flat cell index i."""
+        return ((i % self.cols) * self.cell, (i // self.cols) * self.cell)
+
+    def add(self, pos):
+        i = self.index(pos)
+        if i >= 0:
+            if not self.counts[i]:
+                self.free.discard(i)
+            self.counts[i] += 1
+
+    def remove(self, pos):
+        i = self.index(pos)
+        if i >= 0:
+            self.counts[i] -= 1
+            if not self.counts[i] and not self.blocked[i]:
+                self.free.add(i)
+
+    def count(self, pos):
+        i = self.index(pos)
+        return self.counts[i] if i >= 0 else 0
+
+
+class Snake:
+    """One player's snake. Positions are (x, y) pixel tuples snapped to the grid.
+
+    The body is a deque with the head at index 0; every change goes through
+    push_head() / pop_tail() (or their reverses) / set_state() so the shared Occupancy stays in sync.
+    `edits` counts those changes, so a reader can tell the body is unchanged in O(1).
+    """
+
+    __slots__ = ('player', 'grid', 'body', 'edits', 'direction', 'change_to', 'score', 'alive')
+
+    def __init__(self, player, grid):
+        self.player = player
+        self.grid = grid
+        self.body = deque()
+        self.edits = 0
+        self.direction = 'RIGHT'
+        self.change_to = 'RIGHT'
+        self.score = 0
+        self.alive = True
+
+    @property
+    def pos(self):
+        """Head position (x, y)."""
+        return self.body[0]
+
+    def push_head(self, pos):
+        self.body.appendleft(pos)
+        self.grid.add(pos)
+        self.edits += 1
+
+    def pop_tail(self):
+        pos = self.body.pop()
+        self.grid.remove(pos)
+        self.edits += 1
+        return pos
+
+    def pop_head(self):
+        pos = self.body.popleft()
+        self.grid.remove(pos)
+        self.edits += 1
+        return pos
+
+    def push_tail(self, pos):
+        self.body.append(pos)
+        self.grid.add(pos)
+        self.edits += 1
+
+    def set_body(self, body):
+        """Replace the whole body (head first)."""
+        grid = self.grid
+        for pos in self.body:
+            grid.remove(pos)
+        self.body = deque((seg[0], seg[1]) for seg in body)
+        for pos in self.body:
+            grid.add(pos)
+        self.edits += 1
+
+    def set_state(self, body, direction, score):
+        """Overwrite the snake with a full state (e.g. received from a peer)."""
+        self.set_body(body)
+        self.direction = direction
+        self.score = score
+
+    def turn(self):
+        """Apply the queued direction, ignoring 180 degree turns."""
+        if self.change_to in MOVES and self.change_to != OPPOSITE[self.direction]:
+            self.direction = self.change_to
+
+
+class GameState:
+    """Whole-match state for a board of width x height pixels in cells of `cell`.
+
+    step() advances one logic tick. Everything here is plain Python so it can
+    run thousands of matches per second without a display.
+    """
+
+    def __init__(self, width, height, cell, players=2, rng=None, reserved_rows=(0, 0)):
+        self.width = width
+        self.height = height
+        self.cell = cell
+        self.rng = rng if rng is not None else random.Random()
+        self.grid = Occupancy(width, height, cell, self.no_fruit_cells(reserved_rows))
+        self.snakes = [Snake(player, self.grid) for player in range(1, players + 1)]
+        self.active = set(range(1, players + 1))  # PLAYERS STILL IN THE MATCH (GET A SNAKE ON RESET)
+        self.fruit_pos = (0, 0)
+        self.fruit_spawn = True  # False WHILE THE FRUIT IS EATEN AND NOT YET RESPAWNED
+        self.phase = STATE_COUNTDOWN
+        self.winner = None  # PLAYER NUMBER, OR None FOR A DRAW, ONCE GAME OVER
+        self.tick = 0
+
+    def snake(self, player):
+        return self.snakes[player - 1]
+
+    # --- Setup ---
+    def start_positions(self):
+        """(x, y, direction) per snake: odd players on the left heading right,
+        even players on the right heading left, rows spread evenly."""
+        rows = (len(self.snakes) + 1) // 2
+        starts = []
+        for i in range(len(self.snakes)):
+            y = self.height * (i // 2 + 1) // (rows + 1)
+            if i % 2 == 0:
+                starts.append((self.width // 4, y, 'RIGHT'))
+            else:
+                starts.append((self.width * 3 // 4, y, 'LEFT'))
+        return starts
+
+    def reset(self):
+        """Re-center snakes, clear scores, place new fruit and restart the countdown.
+
+        Players no longer in the match (see drop_player) get no snake.
+        """
+        cell = self.cell
+        for snake, (x, y, direction) in zip(self.snakes, self.start_positions()):
+            snake.score = 0
+            if snake.player not in self.active:
+                snake.set_body(())
+                snake.alive = False
+                continue
+            x = (x // cell) * cell
+            y = (y // cell) * cell
+            dx, _ = MOVES[direction]
+            snake.set_body([(x - dx * i * cell, y) for i in range(START_LENGTH)])
+            snake.direction = direction
+            snake.change_to = direction
+            snake.alive = True
+
+        self.place_fruit()
+        self.phase = STATE_COUNTDOWN
+        self.winner = None
+        self.tick = 0
+
+    def no_fruit_cells(self, reserved_rows):
+        """Flat indices of the wall ring plus reserved_rows = (top, bottom) rows
+        kept clear for the HUD; fruit never spawns there."""
+        cols = self.width // self.cell
+        rows = self.height // self.cell
+        top = max(1, reserved_rows[0])
+        bottom = rows - max(1, reserved_rows[1])
+        for row in range(rows):
+            for col in range(cols):
+                if row < top or row >= bottom or col == 0 or col == cols - 1:
+                    yield row * cols + col
+
+    def drop_player(self, player):
+        """Take a player who left out of the match: their snake disappears now
+        and on every later reset. Returns True if this decided the game."""
+        snake = self.snake(player)
+        self.active.discard(player)
+        snake.set_body(())
+        was_alive, snake.alive = snake.alive, False
+        if self.phase != STATE_RUNNING or not was_alive:
+            return False
+        return self.finish_if_decided()
+
+    def place_fruit(self):
+        """Put the fruit on a uniformly random empty cell (O(1) via the free-cell
+        index). If the board is full it stays eaten and is retried next tick."""
+        i = self.grid.free.sample(self.rng)
+        if i is None:
+            self.fruit_spawn = False
+            return
+        self.fruit_pos = self.grid.position(i)
+        self.fruit_spawn = True
+
+    # --- Simulation ---
+    def step(self, inputs=None, players=None, spawn_fruit=True):
+        """Advance the match by one tick: move() then check_collisions().
+
+        inputs maps player -> requested direction. players limits which snakes
+        are moved (a networked peer only moves its own); by default every live
+        snake moves. spawn_fruit is False on peers that wait for the fruit
+        position from someone else. Returns True if this tick ended the game.
+        """
+        if self.phase != STATE_RUNNING:
+            return False
+        self.move(inputs, players, spawn_fruit)
+        return self.check_collisions()
+
+    def move(self, inputs=None, players=None, spawn_fruit=True):
+        """The first half of step(): turn and move the snakes, eat and respawn
+        the fruit. Collisions are not checked; call check_collisions() next."""
+        if self.phase != STATE_RUNNING:
+            return
+
+        inputs = inputs or {}
+        movers = self.snakes if players is None else [self.snake(p) for p in players]
+        for snake in movers:
+            if not snake.alive:
+                continue
+            if snake.player in inputs:
+                snake.change_to = inputs[snake.player]
+            snake.turn()
+
+            dx, dy = MOVES[snake.direction]
+            x, y = snake.pos
+            head = (x + dx * self.cell, y + dy * self.cell)
+
+            # Grow Snake / Eat fruit
+            snake.push_head(head)
+            if head == self.fruit_pos:
+                snake.score += FRUIT_POINTS
+                self.fruit_spawn = False
+            else:
+                snake.pop_tail()
+
+        if spawn_fruit and not self.fruit_spawn:
+            self.place_fruit()
+
+        self.tick += 1
+
+    def in_bounds(self, pos):
+        return 0 <= pos[0] <= self.width - self.cell and 0 <= pos[1] <= self.height - self.cell
+
+    def check_collisions(self):
+        """Kill snakes that hit a wall, themselves or another snake.
+
+        A head sharing its cell with any other segment (its own or another
+        snake's, including dead snakes left on the board) is a collision, so
+        each check is a single Occupancy lookup. The game ends once at most
+        one snake is left; the survivor wins, and if every remaining snake
+        died on the same tick it is a draw. Returns True if this call ended
+        the game.
+        """
+        if self.phase != STATE_RUNNING:
+            return False
+
+        alive = [snake for snake in self.snakes if snake.alive]
+        dead = []
+        for snake in alive:
+            head = snake.pos
+            if not self.in_bounds(head) or self.grid.count(head) > 1:
+                dead.append(snake)
+
+        if not dead:
+            return False
+        for snake in dead:
+            snake.alive = False
+        return self.finish_if_decided()
+
+    def finish_if_decided(self):
+        """End the game if at most one snake is left alive; returns True if it ended."""
+        survivors = [snake for snake in self.snakes if snake.alive]
+        if len(survivors) > 1:
+            return False
+        self.phase = STATE_GAME_OVER
+        self.winner = survivors[0].player if survivors else None
+        return True
@@ -0,0 +1,547 @@
+# ==============================================================================
+# GROUP MEMBERS: Adrian R., Christian V., Kamy A. and Vanessa F.
+# ASGT: Project
+# ORGN: CMPS 3640
+# FILE: snake_netsim.py
+# DATE:
+# DESCRIPTION: Two-peer test harness for one machine. Starts a host and a
+#              client (each a headless copy of the game playing by itself)
+#              on loopback, with the client talking to the host through a
+#              proxy that adds latency, jitter, packet loss, reordering and
+#              a bandwidth cap. Reports how far each peer's view of the
+#              other snake was off (divergence), how often it stalled, and
+#              what the proxy did to the traffic, as JSON.
+#
+#              python3 snake_netsim.py --latency 60 --jitter 20 --loss 0.02 --udp
+#              python3 snake_netsim.py --lockstep --latency 80 --seconds 20
+# ==============================================================================
+
+# === Libraries ===
+import argparse
+import asyncio
+import bisect
+import json
+import os
+import random
+import socket
+import statistics
+import sys
+import time
+import zlib
+
+from snake_engine import DIRECTIONS, MOVES, OPPOSITE, STATE_COUNTDOWN, STATE_RUNNING, STATE_GAME_OVER
+from snake_protocol import FrameReader, WireCodec, WIRE_BINARY, WIRE_JSON, JSON_MARKER, MSG_CONNECT
+
+# === Settings ===
+TCP_RETRANSMIT_MS = 200  # EXTRA DELAY FOR A "LOST" TCP SEGMENT (TCP RESENDS IT, NEVER DROPS IT)
+REORDER_MS = 30  # EXTRA DELAY THAT MAKES A REORDERED DATAGRAM ARRIVE AFTER LATER ONES
+QUEUE_LIMIT_MS = 250  # DATAGRAMS WAITING LONGER THAN THIS FOR BANDWIDTH ARE DROPPED
+CONNECT_TIMEOUT = 10.0  # SECONDS FOR THE PEERS TO START THE MATCH
+REMATCH_DELAY = 0.5  # SECONDS THE HOST WAITS AFTER A GAME OVER BEFORE RESETTING
+COUNTDOWN = 0.5  # SECONDS OF COUNTDOWN PER ROUND (SHORTER THAN IN THE GAME)
+
+
+# === Impairment ===
+class Impairment:
+    """What one direction of the simulated network does to traffic.
+
+    latency_ms is one-way; every packet gets it plus a uniform random
+    0..jitter_ms. A lost datagram is gone; a lost TCP segment arrives
+    TCP_RETRANSMIT_MS later and holds back everything behind it, since TCP
+    delivers in order. reorder is the chance a datagram is held back an
+    extra REORDER_MS. bandwidth_kbps (0 = unlimited) serialises everything
+    in this direction, TCP and UDP alike.
+    """
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, loss=0.0, reorder=0.0, bandwidth_kbps=0.0, rng=None):
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.loss = loss
+        self.reorder = reorder
+        self.bandwidth = bandwidth_kbps * 1000.0 / 8.0  # BYTES PER SECOND
+        self.rng = rng or random.Random()
+        self.free_at = 0.0  # WHEN THE LINK HAS SENT EVERYTHING QUEUED SO FAR
+        self.stream_at = 0.0  # DELIVERY TIME OF THE LAST TCP FRAME (KEEPS THEM IN ORDER)
+        self.stats = {'frames': 0, 'datagrams': 0, 'bytes': 0, 'dropped': 0, 'retransmitted': 0,
+                      'reordered': 0, 'queue_dropped': 0}
+
+    def transmit(self, size, now, drop=True):
+        """When `size` bytes handed over at `now` have left the link, or None
+        if (with drop) they would wait longer than QUEUE_LIMIT_MS for it."""
+        if not self.bandwidth:
+            return now
+        start = max(now, self.free_at)
+        if drop and start - now > QUEUE_LIMIT_MS / 1000.0:
+            return None
+        self.free_at = start + size / self.bandwidth
+        return self.free_at
+
+    def delay(self):
+        return self.latency + (self.rng.random() * self.jitter if self.jitter else 0.0)
+
+    def stream(self, size, now):
+        """Delivery time of a TCP frame (never earlier than the one before it)."""
+        self.stats['frames'] += 1
+        self.stats['bytes'] += size
+        at = self.transmit(size, now, drop=False) + self.delay()
+        if self.loss and self.rng.random() < self.loss:
+            self.stats['retransmitted'] += 1
+            at += TCP_RETRANSMIT_MS / 1000.0
+        self.stream_at = max(self.stream_at, at)
+        return self.stream_at
+
+    def datagram(self, size, now):
+        """Delivery time of a datagram, or None if it is lost."""
+        self.stats['datagrams'] += 1
+        self.stats['bytes'] += size
+        if self.loss and self.rng.random() < self.loss:
+            self.stats['dropped'] += 1
+            return None
+        sent = self.transmit(size, now)
+        if sent is None:
+            self.stats['queue_dropped'] += 1
+            return None
+        at = sent + self.delay()
+        if self.reorder and self.rng.random() < self.reorder:
+            self.stats['reordered'] += 1
+            at += REORDER_MS / 1000.0
+        return at
+
+
+class Relay(asyncio.DatagramProtocol):
+    """One UDP socket of the proxy; datagrams arriving on it go to on_datagram."""
+
+    def __init__(self, on_datagram):
+        self.on_datagram = on_datagram
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.on_datagram(data)
+
+
+class ProxySession:
+    """One client connection through the proxy: its TCP stream both ways, and
+    (once the connect messages announce UDP ports) its state datagrams.
+
+    The proxy reads the game's frames, so it can swap the UDP ports in both
+    connect messages for its own sockets: the host then sends datagrams to
+    `host_side` and the client to `client_side`, and both go through the
+    impairment like the TCP traffic does.
+    """
+
+    def __init__(self, up, down):
+        self.up = up  # CLIENT -> HOST
+        self.down = down  # HOST -> CLIENT
+        self.host_side = None  # Relay THE HOST SENDS TO / WE SEND TO THE HOST FROM
+        self.client_side = None  # Relay THE CLIENT SENDS TO / WE SEND TO THE CLIENT FROM
+        self.host_udp = None  # (IP, PORT) OF THE HOST'S STATE SOCKET
+        self.client_udp = None
+
+    async def open_udp(self):
+        if self.host_side:
+            return
+        loop = asyncio.get_running_loop()
+        _, self.host_side = await loop.create_datagram_endpoint(
+            lambda: Relay(lambda data: self.forward(data, self.down, self.client_side, self.client_udp)),
+            local_addr=('127.0.0.1', 0))
+        _, self.client_side = await loop.create_datagram_endpoint(
+            lambda: Relay(lambda data: self.forward(data, self.up, self.host_side, self.host_udp)),
+            local_addr=('127.0.0.1', 0))
+
+    def forward(self, data, impairment, relay, addr):
+        if addr is None:
+            return
+        loop = asyncio.get_running_loop()
+        at = impairment.datagram(len(data), loop.time())
+        if at is not None:
+            loop.call_at(at, relay.transport.sendto, data, addr)
+
+    async def rewrite(self, payload, from_client):
+        """Point a connect message's UDP port at our relay (other frames pass unchanged)."""
+        if payload[0] not in (JSON_MARKER, MSG_CONNECT):
+            return payload
+        codec = WireCodec(1, WIRE_JSON if payload[0] == JSON_MARKER else WIRE_BINARY)
+        msg = codec.decode(payload)
+        if msg.get('type') != 'connect' or not msg.get('udp_port'):
+            return payload
+        await self.open_udp()
+        if from_client:
+            self.client_udp = ('127.0.0.1', msg['udp_port'])
+            msg['udp_port'] = self.host_side.transport.get_extra_info('sockname')[1]
+        else:
+            self.host_udp = ('127.0.0.1', msg['udp_port'])
+            msg['udp_port'] = self.client_side.transport.get_extra_info('sockname')[1]
+        return codec.encode(msg)[4:]
+
+    async def pump(self, reader, writer, impairment, from_client):
+        """Copy one direction of the TCP stream frame by frame, each delivered
+        at the time the impairment gives it."""
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+
+        async def deliver():
+            while True:
+                at, frame = await queue.get()
+                if frame is None:
+                    break
+                await asyncio.sleep(max(0.0, at - loop.time()))
+                writer.write(frame)
+            writer.close()
+
+        delivery = asyncio.ensure_future(deliver())
+        frames = FrameReader()
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                for payload in frames.feed(data):
+                    payload = await self.rewrite(payload, from_client)
+                    frame = WireCodec.frame(payload)
+                    queue.put_nowait((impairment.stream(len(frame), loop.time()), frame))
+        except (ConnectionError, ValueError):
+            pass
+        queue.put_nowait((0.0, None))
+        await delivery
+
+    def close(self):
+        for relay in (self.host_side, self.client_side):
+            if relay:
+                relay.transport.close()
+
+
+class ImpairmentProxy:
+    """Listens on listen_port and forwards every connection to the host at
+    host_port through a ProxySession, with `settings` (Impairment keyword
+    arguments) applied in both directions."""
+
+    def __init__(self, listen_port, host_port, settings, seed=0):
+        self.listen_port = listen_port
+        self.host_port = host_port
+        self.settings = settings
+        self.rng = random.Random(seed)
+        self.sessions = []
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.accept, '127.0.0.1', self.listen_port)
+
+    async def accept(self, client_reader, client_writer):
+        host_reader, host_writer = await asyncio.open_connection('127.0.0.1', self.host_port)
+        for writer in (client_writer, host_writer):
+            writer.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        session = ProxySession(Impairment(rng=self.rng, **self.settings),
+                               Impairment(rng=self.rng, **self.settings))
+        self.sessions.append(session)
+        await asyncio.gather(session.pump(client_reader, host_writer, session.up, True),
+                             session.pump(host_reader, client_writer, session.down, False))
+        session.close()
+
+    def stats(self):
+        """Traffic counters per direction, summed over sessions."""
+        totals = {}
+        for session in self.sessions:
+            for name, impairment in (('up', session.up), ('down', session.down)):
+                direction = totals.setdefault(name, {})
+                for key, value in impairment.stats.items():
+                    direction[key] = direction.get(key, 0) + value
+        return totals
+
+    def close(self):
+        if self.server:
+            self.server.close()
+        for session in self.sessions:
+            session.close()
+
+
+# === Peers ===
+def autopilot(snake_game, rng):
+    """Steer our snake: keep going while the next cell is free, sometimes turn,
+    and never turn into a wall or a snake if there is a way out."""
+    game = snake_game.game
+    snake = game.snake(snake_game.local_player)
+    if not snake.alive or not snake.body:
+        return
+    x, y = snake.pos
+
+    def free(direction):
+        dx, dy = MOVES[direction]
+        head = (x + dx * game.cell, y + dy * game.cell)
+        return game.in_bounds(head) and not game.grid.count(head)
+
+    options = [d for d in DIRECTIONS if d != OPPOSITE[snake.direction] and free(d)]
+    if not options:
+        return
+    direction = snake.direction
+    if direction not in options or rng.random() < 0.1:
+        direction = rng.choice(options)
+    if snake_game.lockstep:
+        snake_game.lockstep_direction = direction
+    else:
+        snake.change_to = direction
+
+
+def state_hash(game):
+    """Checksum of every snake and the fruit (same on both peers in lockstep)."""
+    return zlib.crc32(repr(([list(s.body) for s in game.snakes], game.fruit_pos)).encode('utf-8'))
+
+
+def run_peer(role, port, until, seed, lockstep, use_udp):
+    """One headless peer: join / host the match, play by itself until `until`
+    (a time.time()), and print one JSON sample per tick to stdout."""
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+    import pygame
+    import snake_p2p_simple as snake_game
+
+    snake_game.LOCKSTEP = lockstep
+    snake_game.USE_UDP = use_udp
+    snake_game.REPLAY_DIR = None
+    rng = random.Random(f"{seed}-{role}")
+
+    def emit(record):
+        print(json.dumps(record), flush=True)
+
+    if role == 'host':
+        snake_game.init_host(port)
+    else:
+        snake_game.init_client('127.0.0.1', port)
+    emit({'ready': True, 'cell': snake_game.CELL, 'tick_rate': snake_game.snake_speed})
+    deadline = time.time() + CONNECT_TIMEOUT
+    while not snake_game.peer_connected:
+        if time.time() > deadline:
+            emit({'error': 'no match started'})
+            return 1
+        time.sleep(0.01)
+        snake_game.drain_inbound()
+
+    snake_game.start_state_sync()
+    snake_game.reset_game_state()
+    snake_game.countdown_start_ms = pygame.time.get_ticks()
+
+    tick_s = 1.0 / snake_game.snake_speed
+    next_tick = time.monotonic()
+    over_since = None
+    while time.time() < until:
+        next_tick += tick_s
+        time.sleep(max(0.0, next_tick - time.monotonic()))
+        if snake_game.back_to_menu or not snake_game.peer_connected:
+            emit({'error': 'peer left'})
+            break
+        game = snake_game.game
+        if game.phase == STATE_COUNTDOWN:
+            if (pygame.time.get_ticks() - snake_game.countdown_start_ms) / 1000.0 >= COUNTDOWN:
+                game.phase = STATE_RUNNING
+        if game.phase == STATE_RUNNING:
+            autopilot(snake_game, rng)
+
+        tick = game.tick
+        snake_game.game_tick()
+        game = snake_game.game
+        stalled = lockstep and game.phase == STATE_RUNNING and game.tick == tick
+        emit({'t': time.time(), 'tick': game.tick, 'phase': game.phase,
+              'round': snake_game.lockstep.round if snake_game.lockstep else None,
+              'player': snake_game.local_player,
+              'heads': {snake.player: snake.pos if snake.body else None for snake in game.snakes},
+              'stale': {player: predictor.stale_ticks
+                        for player, predictor in snake_game.remote_predictors.items()},
+              'stalled': stalled, 'hash': state_hash(game) if lockstep else None})
+
+        # REMATCH AFTER A GAME OVER, AS IF THE HOST PRESSED R
+        if game.phase == STATE_GAME_OVER and snake_game.is_host:
+            over_since = over_since or time.time()
+            if time.time() - over_since >= REMATCH_DELAY:
+                snake_game.reset_game_state(new_round=True)
+                snake_game.countdown_start_ms = pygame.time.get_ticks()
+                snake_game.send_control_message('reset')
+                over_since = None
+
+    emit({'done': True, 'prediction': snake_game.prediction_stats(),
+          'network': snake_game.network_stats()})
+    time.sleep(0.2)  # LET THE OTHER PEER FINISH BEFORE WE HANG UP
+    snake_game.close_connection()
+    return 0
+
+
+# === Analysis ===
+def summarize(values):
+    if not values:
+        return {'samples': 0}
+    ordered = sorted(values)
+    return {'samples': len(ordered), 'mean': round(statistics.fmean(ordered), 3),
+            'p95': ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 'max': ordered[-1]}
+
+
+def divergence(viewer, owner, cell, tick_s):
+    """Cells between where `viewer` showed the owner's snake and where the owner
+    had it at that moment (its newest tick at or before the viewer's), over
+    the samples where both were playing. Remote snakes are drawn a tick or
+    so ahead (see RemotePredictor), so about 1 is normal even on a perfect link."""
+    owner_samples = [s for s in owner if 'heads' in s]
+    times = [s['t'] for s in owner_samples]
+    player = str(owner_samples[0]['player']) if owner_samples else None
+    errors = []
+    for sample in viewer:
+        if sample.get('phase') != STATE_RUNNING:
+            continue
+        i = bisect.bisect_right(times, sample['t']) - 1
+        if i < 0 or sample['t'] - times[i] > tick_s:
+            continue
+        truth = owner_samples[i]
+        shown = sample['heads'].get(player)
+        actual = truth['heads'].get(player)
+        if truth['phase'] != STATE_RUNNING or shown is None or actual is None:
+            continue
+        errors.append((abs(shown[0] - actual[0]) + abs(shown[1] - actual[1])) // cell)
+    result = summarize(errors)
+    result['off_fraction'] = round(sum(1 for e in errors if e) / len(errors), 4) if errors else None
+    return result
+
+
+def lockstep_divergence(host, client):
+    """Ticks (per round) where the two lockstep simulations disagree."""
+    hashes = {}
+    for sample in host:
+        if sample.get('phase') == STATE_RUNNING:
+            hashes.setdefault((sample['round'], sample['tick']), sample['hash'])
+    compared = mismatched = 0
+    first = None
+    for sample in client:
+        key = (sample.get('round'), sample.get('tick'))
+        if sample.get('phase') != STATE_RUNNING or key not in hashes:
+            continue
+        compared += 1
+        if hashes[key] != sample['hash']:
+            mismatched += 1
+            first = first or {'round': key[0], 'tick': key[1]}
+    return {'ticks_compared': compared, 'mismatched_ticks': mismatched, 'first_mismatch': first}
+
+
+def stalls(samples, lockstep):
+    """How often the game on one peer was held up: in lockstep, ticks spent
+    waiting for the other player's input; otherwise, ticks in which the
+    other snake got no new state (it was shown from a guess or frozen)."""
+    running = [s for s in samples if s.get('phase') == STATE_RUNNING]
+    flags = [s['stalled'] if lockstep else any(s['stale'].values()) for s in running]
+    longest = streak = 0
+    for flag in flags:
+        streak = streak + 1 if flag else 0
+        longest = max(longest, streak)
+    return {'running_ticks': len(flags), 'stalled_ticks': sum(flags),
+            'stall_fraction': round(sum(flags) / len(flags), 4) if flags else None,
+            'longest_stall_ticks': longest}
+
+
+# === Harness ===
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def start_peer(role, port, until, args):
+    command = [sys.executable, os.path.abspath(__file__), '--peer', role, '--port', str(port),
+               '--until', str(until), '--seed', str(args.seed)]
+    if args.lockstep:
+        command.append('--lockstep')
+    if args.udp:
+        command.append('--udp')
+    return await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.PIPE,
+                                                cwd=os.path.dirname(os.path.abspath(__file__)))
+
+
+async def read_samples(process, samples, ready=None, verbose=False):
+    """Collect a peer's JSON lines (other output is the game's own logging)."""
+    async for line in process.stdout:
+        text = line.decode('utf-8', 'replace').strip()
+        if text.startswith('{'):
+            record = json.loads(text)
+            if record.get('ready') and ready:
+                ready.set()
+            samples.append(record)
+        elif verbose:
+            print(text, file=sys.stderr)
+    await process.wait()
+
+
+async def run_harness(args):
+    host_port = args.port or free_port()
+    proxy_port = free_port()
+    settings = {'latency_ms': args.latency, 'jitter_ms': args.jitter, 'loss': args.loss,
+                'reorder': args.reorder, 'bandwidth_kbps': args.bandwidth}
+    proxy = ImpairmentProxy(proxy_port, host_port, settings, args.seed)
+    await proxy.start()
+
+    until = time.time() + args.seconds + 3.0  # TIME TO CONNECT INCLUDED
+    samples = {'host': [], 'client': []}
+    ready = asyncio.Event()
+    host = await start_peer('host', host_port, until, args)
+    host_reader = asyncio.ensure_future(read_samples(host, samples['host'], ready, args.verbose))
+    await asyncio.wait_for(ready.wait(), CONNECT_TIMEOUT)
+    client = await start_peer('client', proxy_port, until, args)
+    await asyncio.gather(host_reader, read_samples(client, samples['client'], verbose=args.verbose))
+    proxy.close()
+
+    ticks = {role: [s for s in records if 'tick' in s] for role, records in samples.items()}
+    done = {role: next((s for s in records if s.get('done')), None) for role, records in samples.items()}
+    errors = {role: [s['error'] for s in records if 'error' in s] for role, records in samples.items()}
+    report = {
+        'settings': dict(settings, seconds=args.seconds, udp=args.udp, lockstep=args.lockstep, seed=args.seed),
+        'errors': {role: e for role, e in errors.items() if e},
+        'stalls': {role: stalls(records, args.lockstep) for role, records in ticks.items()},
+        'proxy': proxy.stats(),
+        'prediction': {role: d and d['prediction'] for role, d in done.items()},
+        'latency': {role: d and d['network'] for role, d in done.items()},
+    }
+    if args.lockstep:
+        report['divergence'] = lockstep_divergence(ticks['host'], ticks['client'])
+    else:
+        hello = next(s for s in samples['host'] if s.get('ready'))
+        cell, tick_s = hello['cell'], 1.0 / hello['tick_rate']
+        report['divergence'] = {
+            'host_view_of_client': divergence(ticks['host'], ticks['client'], cell, tick_s),
+            'client_view_of_host': divergence(ticks['client'], ticks['host'], cell, tick_s),
+        }
+    failed = (host.returncode or client.returncode or report['errors'] or not all(done.values())
+              or (args.lockstep and report['divergence']['mismatched_ticks']))
+    return report, bool(failed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a host and a client on loopback through an impaired link.")
+    parser.add_argument('--seconds', type=float, default=15.0, help="how long the peers play")
+    parser.add_argument('--latency', type=float, default=50.0, help="one-way delay (ms)")
+    parser.add_argument('--jitter', type=float, default=10.0, help="extra random 0..JITTER ms per packet")
+    parser.add_argument('--loss', type=float, default=0.0, help="packet loss fraction (0..1)")
+    parser.add_argument('--reorder', type=float, default=0.0, help="fraction of datagrams delivered late (0..1)")
+    parser.add_argument('--bandwidth', type=float, default=0.0, help="kbit/s each way (0 = unlimited)")
+    parser.add_argument('--udp', action='store_true', help="peers send state over UDP (USE_UDP)")
+    parser.add_argument('--lockstep', action='store_true', help="peers play in lockstep (LOCKSTEP)")
+    parser.add_argument('--seed', type=int, default=1, help="seed for the impairment and the autopilots")
+    parser.add_argument('--port', type=int, default=0, help="host port (default: any free one)")
+    parser.add_argument('--out', help="also write the report to this file")
+    parser.add_argument('--verbose', action='store_true', help="show the peers' own output")
+    # INTERNAL: RUN AS ONE OF THE PEERS
+    parser.add_argument('--peer', choices=('host', 'client'), help=argparse.SUPPRESS)
+    parser.add_argument('--until', type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.peer:
+        return run_peer(args.peer, args.port, args.until, args.seed, args.lockstep, args.udp)
+
+    report, failed = asyncio.run(run_harness(args))
+    text = json.dumps(report, indent=1)
+    print(text)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + '\n')
+    # NON-ZERO EXIT IF A PEER FAILED OR A LOCKSTEP MATCH DESYNCED, SO CI CAN CATCH IT
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
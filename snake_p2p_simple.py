@@ -10,18 +10,57 @@
 
 # === Libraries ===
 import pygame
+import os
+import sys
 import time
 import random
-import json
 import socket
+import struct
 import threading
+import asyncio
 import math
+import itertools
+from collections import OrderedDict, deque
+
+from snake_engine import (GameState, STATE_COUNTDOWN, STATE_RUNNING,
+                          STATE_PAUSED, STATE_GAME_OVER)
+from snake_protocol import (DeltaEncoder, RemotePredictor, WireCodec, FrameReader,
+                            RedundantSender, LatencyEstimator, LockstepInputs, split_frames,
+                            keyframe, PROTOCOL_VERSION, WIRE_BINARY)
+from snake_replay import ReplayRecorder, ReplayPlayer
+from snake_profiler import FrameProfiler, PHASES
 
 # === Settings ===
 snake_speed = 10  # speed of snake (logic FPS)
 screen_width = 720
 screen_height = 480
 CELL = 10  # grid size
+WORLD_COLS = screen_width // CELL  # ARENA SIZE IN CELLS; BIGGER THAN THE WINDOW SCROLLS (e.g. 500 x 500)
+WORLD_ROWS = screen_height // CELL
+world_width = WORLD_COLS * CELL
+world_height = WORLD_ROWS * CELL
+HUD_TOP_ROWS = 7  # GRID ROWS UNDER THE TITLE / SCORES / STATUS LINE (NO FRUIT THERE)
+HUD_BOTTOM_ROWS = 3  # GRID ROWS UNDER THE CONTROLS LINE
+DIRTY_RECTS = False  # ONLY REPAINT + FLIP CHANGED REGIONS DURING PLAY (OPT-IN)
+RENDER_FPS = 60  # drawing + input polling rate, independent of snake_speed
+INTERPOLATE = False  # SLIDE SEGMENTS SMOOTHLY BETWEEN LOGIC TICKS
+MAX_FRAME_MS = 250  # CLAMP ON ONE FRAME'S ELAPSED TIME (E.G. AFTER A MENU OR A STALL)
+WIRE_FORMAT = WIRE_BINARY  # SET TO WIRE_JSON TO SEE READABLE TRAFFIC WHEN DEBUGGING
+USE_UDP = False  # SEND PER-TICK STATE OVER UDP (CONTROL MESSAGES STAY ON TCP)
+UDP_REDUNDANCY = 3  # STATE FRAMES REPEATED IN EACH DATAGRAM, NEWEST LAST
+UDP_MAX_DATAGRAM = 1200  # BIGGER STATE FRAMES (LONG-SNAKE KEYFRAMES) GO OVER TCP
+MAX_CONTROL_QUEUE = 256  # UNSENT CONTROL MESSAGES BEFORE WE GIVE UP ON THE PEER
+SPECTATOR_SEND_BUFFER = 4096  # BYTES THE OS MAY QUEUE FOR A SPECTATOR; A SLOWER ONE SKIPS TO KEYFRAMES
+PING_INTERVAL = 1.0  # SECONDS BETWEEN LATENCY PROBES
+MAX_PLAYERS = 2  # SNAKES PER MATCH, HOST INCLUDED (UP TO 16); THE HOST CAN START EARLY WITH ENTER
+PREDICT_REMOTE = True  # DEAD-RECKON THE PEER'S SNAKE BETWEEN UPDATES
+MAX_PREDICT_TICKS = 3  # NEVER GUESS MORE THAN THIS MANY CELLS AHEAD
+LOCKSTEP = False  # BOTH PEERS SIMULATE EVERYTHING AND ONLY SEND KEY PRESSES (BOTH MUST MATCH)
+LOCKSTEP_DELAY = 2  # TICKS BETWEEN A KEY PRESS AND THE TICK IT APPLIES TO (IN LOCKSTEP)
+REPLAY_DIR = "replays"  # EVERY MATCH IS RECORDED HERE (None = DON'T RECORD)
+PROFILE_WINDOW = 300  # FRAMES THE PROFILER OVERLAY'S p50 / p95 / max COVER
+PROFILE_LOG = None  # e.g. "frames.csv" OR "frames.jsonl": PER-FRAME PHASE TIMES
+PROFILE_CAPTURE_TICKS = 100  # LOGIC TICKS ONE cProfile CAPTURE COVERS
 
 # --- UI Colors ---
 BORDER_COLOR = (90, 90, 90)
@@ -32,19 +71,25 @@ P1_COLOR = (80, 230, 140)
 P1_OUTLINE = (30, 150, 80)
 P2_COLOR = (100, 150, 255)
 P2_OUTLINE = (40, 90, 190)
+PLAYER_COLORS = [  # (fill, outline) PER PLAYER, REPEATING AFTER THE LAST
+    (P1_COLOR, P1_OUTLINE), (P2_COLOR, P2_OUTLINE),
+    ((255, 120, 110), (180, 60, 50)), ((230, 130, 255), (150, 70, 190)),
+    ((255, 170, 70), (190, 110, 30)), ((90, 225, 230), (40, 150, 160)),
+    ((235, 235, 235), (150, 150, 150)), ((200, 230, 90), (130, 160, 40)),
+]
 FRUIT_COLOR = (255, 230, 80)
 FRUIT_GLOW = (255, 200, 80)
 TEXT_COLOR = (240, 240, 240)
 TEXT_SHADOW = (0, 0, 0)
 
-# Game state constants
-STATE_COUNTDOWN = "COUNTDOWN"
-STATE_RUNNING = "RUNNING"
-STATE_PAUSED = "PAUSED"
-STATE_GAME_OVER = "GAME_OVER"
-
 COUNTDOWN_SECONDS = 3
 
+# --- Movement keys (key -> direction) ---
+P1_KEYS = {pygame.K_w: 'UP', pygame.K_s: 'DOWN', pygame.K_a: 'LEFT', pygame.K_d: 'RIGHT'}
+P2_KEYS = {pygame.K_UP: 'UP', pygame.K_DOWN: 'DOWN', pygame.K_LEFT: 'LEFT', pygame.K_RIGHT: 'RIGHT'}
+PROFILE_OVERLAY_KEY = pygame.K_F3  # SHOW / HIDE THE FRAME TIMING OVERLAY
+PROFILE_CAPTURE_KEY = pygame.K_F9  # cProfile THE NEXT PROFILE_CAPTURE_TICKS TICKS
+
 # === Setup ===
 pygame.init()
 screen = pygame.display.set_mode((screen_width, screen_height))
@@ -61,248 +106,1033 @@ FONT_COUNTDOWN = pygame.font.SysFont('consolas', 56, bold=True)
 FONT_SUB = pygame.font.SysFont('consolas', 20)
 
 # === Network Variables ===
-server_socket = None
-client_socket = None
+server = None  # asyncio Server ACCEPTING PEERS WHILE HOSTING
+udp_transport = None  # asyncio DATAGRAM TRANSPORT FOR PER-TICK STATE (USE_UDP)
+host_udp_port = 0  # OUR UDP PORT WHILE HOSTING (SENT TO PEERS IN connect)
+peer_senders = {}  # PLAYER -> PeerLink (HOST: ONE PER PEER, PEER: {1: THE HOST})
+peer_addrs = {}  # PLAYER -> IP ADDRESS OF THAT LINK (UDP SENDERS ARE CHECKED AGAINST IT)
+latencies = {}  # PLAYER -> LatencyEstimator FOR THAT LINK
+spectators = {}  # HOST: PeerLink -> True WHILE THAT SPECTATOR NEEDS A KEYFRAME WORLD
+relay_frames = []  # HOST: PEERS' STATE FRAMES TO FAN OUT WITH OUR NEXT STATE
+match_started = False  # HOST: LOBBY CLOSED, PLAYERS TOLD THEIR NUMBERS
+RELAYED_TYPES = ('pause', 'resume', 'reset', 'keyframe_request', 'input')  # HOST PASSES THESE ON
+udp_newest_seq = {}  # PLAYER -> NEWEST STATE SEQ SEEN OVER UDP
 peer_connected = False
 is_host = False
-local_player = None  # 1 or 2
-remote_snake_data = None
-data_lock = threading.Lock()
+spectating = False  # WATCHING THE HOST'S MATCH WITHOUT A SNAKE OF OUR OWN
+local_player = None  # 1 (HOST) .. MAX_PLAYERS (None WHILE SPECTATING)
+codec = WireCodec(CELL, WIRE_FORMAT)
+inbound = deque()  # (link OR DATAGRAM SENDER, msg, frame, received_at) FROM THE NETWORK THREAD; ONLY THE GAME LOOP POPS
+remote_states = []  # game_state MESSAGES RECEIVED BUT NOT YET APPLIED, IN ORDER
+state_encoder = None  # DeltaEncoder FOR OUR SNAKE (SET UP ONCE CONNECTED)
+eaten_fruit = None  # CLIENT: FRUIT WE ATE, REPORTED IN EVERY STATE UNTIL THE HOST MOVES IT
+remote_predictors = {}  # PLAYER -> RemotePredictor FOR THEIR SNAKE
+next_ping_id = 0
+last_ping_time = 0.0
+lockstep = None  # LockstepInputs WHILE A LOCKSTEP MATCH IS ON
+lockstep_seed = 0  # SHARED FRUIT RNG SEED (PICKED BY THE HOST, SENT IN connect)
+lockstep_direction = None  # LAST KEY PRESSED SINCE OUR PREVIOUS INPUT MESSAGE
+lockstep_sent_tick = -1  # NEWEST TICK WE HAVE SENT OUR INPUT FOR (MINUS THE DELAY)
 running = True
 typed_ip = "" # ADD IP 
 typing_ip = False
 host_ip_text = ""  # TEXT SHOWN ON HOST SCREEN
 back_to_menu = False
-game_winner = None
+recorder = None  # ReplayRecorder FOR THE CURRENT MATCH
+profiler = FrameProfiler(PROFILE_WINDOW)  # PHASE TIMES OF EVERY FRAME OF THE MAIN LOOP
+show_profile = False  # FRAME TIMING OVERLAY ON (PROFILE_OVERLAY_KEY)
+replaying = False  # SHOWING A REPLAY FILE INSTEAD OF A LIVE MATCH
+
+# === Snakes, Fruit + Match Phase (will be reset by reset_game_state) ===
+def make_game(players=2):
+    """A GameState for the configured arena with `players` snake slots."""
+    # THE HUD ONLY COVERS FIXED BOARD ROWS WHEN THE WHOLE ARENA FITS THE WINDOW
+    if (world_width, world_height) == (screen_width, screen_height):
+        return GameState(world_width, world_height, CELL, players,
+                         reserved_rows=(HUD_TOP_ROWS, HUD_BOTTOM_ROWS))
+    return GameState(world_width, world_height, CELL, players)
+
 
-# === Snake + Fruit State (will be reset by reset_game_state) ===
-snake1_pos = [screen_width // 4, screen_height // 2]
-snake1_body = []
-snake1_direction = 'RIGHT'
-snake1_change_to = snake1_direction
-snake1_score = 0
+game = make_game()
 
-snake2_pos = [screen_width * 3 // 4, screen_height // 2]
-snake2_body = []
-snake2_direction = 'LEFT'
-snake2_change_to = snake2_direction
-snake2_score = 0
+# BODIES AT THE START OF THE CURRENT TICK, PER PLAYER (FOR INTERPOLATION)
+prev_bodies = [[] for _ in game.snakes]
 
-fruit_pos = [0, 0]
-fruit_spawn = True
+# WHAT THE RENDERER LAST SAW OF EACH SNAKE (see SnakeView / sync_snake_views)
+snake_views = []
 
 # === Game state variables ===
-game_state = STATE_COUNTDOWN
 countdown_start_ms = 0        # SET AFTER PEER CONNECTS
 connection_initialized = False  # RUN RESET/COUNTDOWNN AFTER CONNECT?
 paused_by = None  # WHO PAUSED ("P1"/"P2")
 
 
+# === Render Caches ===
+STRIPE_WIDTH = 80
+background_pattern = None    # STRIPES + GRID, ONE REPEAT LARGER THAN THE WINDOW
+background_pattern_key = None  # (screen_width, screen_height, CELL) IT WAS BUILT FOR
+background_cache = None      # BACKGROUND LAYER FOR THE CURRENT CAMERA POSITION
+background_cache_key = None  # (PATTERN KEY, CAMERA OFFSET) IT WAS BUILT FOR
+TEXT_CACHE_SIZE = 256        # MAX RENDERED LABELS KEPT (LRU)
+text_cache = OrderedDict()   # (font, text, color, shadow_offset) -> (surface, (w, h))
+segment_sprites = {}         # (CELL, fill, outline) -> ONE PRE-RENDERED SNAKE SEGMENT
+FRUIT_PULSE_FRAMES = 32      # FRUIT SPRITES PER PULSE (ONE FULL SINE PERIOD)
+FRUIT_PULSE_MS = 250.0       # ms PER RADIAN OF THE PULSE (ABOUT 1.6 s PER PULSE)
+fruit_frames = None          # FRUIT_PULSE_FRAMES SPRITES, (CELL + 6) PIXELS SQUARE
+fruit_frames_key = None      # CELL THEY WERE BUILT FOR
+
+
+# === Camera ===
+class Camera:
+    """Top-left world position of the window, following the local snake.
+
+    While the arena fits in the window it stays at (0, 0); otherwise it
+    centres on the followed position, clamped so it never shows past the
+    arena edge. Everything drawn in world coordinates goes through it, and
+    anything outside the view is skipped.
+    """
+
+    def __init__(self):
+        self.x = 0
+        self.y = 0
+
+    def follow(self, pos):
+        self.x = max(0, min(pos[0] + CELL // 2 - screen_width // 2, world_width - screen_width))
+        self.y = max(0, min(pos[1] + CELL // 2 - screen_height // 2, world_height - screen_height))
+
+    def visible(self, x, y, margin=0):
+        """Does the cell at world (x, y), grown by margin pixels, overlap the window?"""
+        return (self.x - CELL - margin < x < self.x + screen_width + margin
+                and self.y - CELL - margin < y < self.y + screen_height + margin)
+
+
+camera = Camera()
+
+
 # === UI Helper Functions ===
-def draw_background(surface: pygame.Surface):
-    """Gradient stripes + grid + border."""
-    stripe_width = 80
-    for x in range(0, screen_width, stripe_width):
-        rect = pygame.Rect(x, 0, stripe_width, screen_height)
-        color = BG_DARK if (x // stripe_width) % 2 == 0 else BG_STRIPE
+def pattern_period():
+    """(x, y) distance after which the stripes + grid repeat."""
+    return math.lcm(2 * STRIPE_WIDTH, CELL), CELL
+
+
+def render_background(surface: pygame.Surface):
+    """Gradient stripes + grid, starting at a world position that is a multiple of pattern_period()."""
+    width, height = surface.get_size()
+    for x in range(0, width, STRIPE_WIDTH):
+        rect = pygame.Rect(x, 0, STRIPE_WIDTH, height)
+        color = BG_DARK if (x // STRIPE_WIDTH) % 2 == 0 else BG_STRIPE
         surface.fill(color, rect)
 
     # grid
-    for x in range(0, screen_width, CELL):
-        pygame.draw.line(surface, GRID_COLOR, (x, 0), (x, screen_height), 1)
-    for y in range(0, screen_height, CELL):
-        pygame.draw.line(surface, GRID_COLOR, (0, y), (screen_width, y), 1)
+    for x in range(0, width, CELL):
+        pygame.draw.line(surface, GRID_COLOR, (x, 0), (x, height), 1)
+    for y in range(0, height, CELL):
+        pygame.draw.line(surface, GRID_COLOR, (0, y), (width, y), 1)
+
+
+def get_background():
+    """Return the cached background layer for the current camera position.
+
+    The stripes + grid pattern is rendered once, one repeat larger than the
+    window, so following the camera is a single blit of the right window
+    out of it plus the arena border.
+    """
+    global background_pattern, background_pattern_key, background_cache, background_cache_key
+
+    pattern_key = (screen_width, screen_height, CELL)
+    period_x, period_y = pattern_period()
+    if background_pattern is None or background_pattern_key != pattern_key:
+        background_pattern = pygame.Surface((screen_width + period_x, screen_height + period_y)).convert()
+        render_background(background_pattern)
+        background_pattern_key = pattern_key
+
+    key = (pattern_key, world_width, world_height, camera.x, camera.y)
+    if background_cache is None or background_cache_key != key:
+        if background_cache is None or background_cache.get_size() != (screen_width, screen_height):
+            background_cache = pygame.Surface((screen_width, screen_height)).convert()
+        area = pygame.Rect(camera.x % period_x, camera.y % period_y, screen_width, screen_height)
+        background_cache.blit(background_pattern, (0, 0), area)
+
+        # border (ARENA EDGE, WHERE IT IS IN VIEW)
+        pygame.draw.rect(background_cache, BORDER_COLOR,
+                         (-camera.x, -camera.y, world_width, world_height), 3)
+        background_cache_key = key
+    return background_cache
 
-    # border
-    pygame.draw.rect(surface, BORDER_COLOR, (0, 0, screen_width, screen_height), 3)
 
+def draw_background(surface: pygame.Surface):
+    """Blit the static background layer in one call."""
+    surface.blit(get_background(), (0, 0))
 
-def draw_snake(surface, body, fill_color, outline_color):
-    for seg in body:
-        x, y = seg
-        rect = pygame.Rect(x, y, CELL, CELL)
-        pygame.draw.rect(surface, outline_color, rect, border_radius=4)
-        inner = rect.inflate(-4, -4)
-        pygame.draw.rect(surface, fill_color, inner, border_radius=4)
 
+def render_text(font, text, color, shadow_offset=2):
+    """Return (surface, rect) for text with its drop shadow composited in.
 
-def draw_fruit(surface, pos):
-    # TIME BASED
-    t = pygame.time.get_ticks() / 250.0  
-    pulse = (math.sin(t) + 1) / 2        # 0..1
+    Surfaces are cached by (font, text, color, shadow_offset) with LRU eviction,
+    so a label is only rasterised again when its text changes. The rect covers
+    the text itself at (0, 0); the shadow hangs off its bottom-right corner.
+    """
+    key = (font, text, color, shadow_offset)
+    entry = text_cache.get(key)
+    if entry is not None:
+        text_cache.move_to_end(key)
+    else:
+        surf = font.render(text, True, color)
+        size = surf.get_size()
+        if shadow_offset:
+            shadow = font.render(text, True, TEXT_SHADOW)
+            combined = pygame.Surface((size[0] + shadow_offset, size[1] + shadow_offset), pygame.SRCALPHA)
+            combined.blit(shadow, (shadow_offset, shadow_offset))
+            combined.blit(surf, (0, 0))
+            surf = combined
+        entry = (surf, size)
+        text_cache[key] = entry
+        if len(text_cache) > TEXT_CACHE_SIZE:
+            text_cache.popitem(last=False)
+    return entry[0], pygame.Rect((0, 0), entry[1])
+
+
+def draw_segment(surface, x, y, fill_color, outline_color):
+    """Rasterise one rounded segment (only used to build segment_sprite())."""
+    rect = pygame.Rect(x, y, CELL, CELL)
+    pygame.draw.rect(surface, outline_color, rect, border_radius=4)
+    inner = rect.inflate(-4, -4)
+    pygame.draw.rect(surface, fill_color, inner, border_radius=4)
+
+
+def segment_sprite(fill_color, outline_color):
+    """The cached CELL x CELL sprite of one segment in these colors."""
+    key = (CELL, fill_color, outline_color)
+    sprite = segment_sprites.get(key)
+    if sprite is None:
+        sprite = pygame.Surface((CELL, CELL), pygame.SRCALPHA)
+        draw_segment(sprite, 0, 0, fill_color, outline_color)
+        sprite = segment_sprites[key] = sprite.convert_alpha()
+    return sprite
+
+
+def draw_snake(surface, body, fill_color, outline_color):
+    """Draw the segments of body (world positions) that are inside the camera
+    view, as one blits() call of the pre-rendered segment sprite."""
+    sprite = segment_sprite(fill_color, outline_color)
+    cam_x, cam_y = camera.x, camera.y
+    left, top = cam_x - CELL, cam_y - CELL
+    right, bottom = cam_x + screen_width, cam_y + screen_height
+    surface.blits([(sprite, (x - cam_x, y - cam_y)) for x, y in body
+                   if left < x < right and top < y < bottom], False)
+
+
+def draw_snake_view(surface, view, prev_body, alpha, fill_color, outline_color):
+    """draw_snake() for a synced SnakeView: only the cells around the camera
+    view are looked at, so long snakes cost no more than short ones.
+
+    With prev_body and alpha < 1, segment i slides from prev_body[i] to where
+    it is now; segments that jumped more than one cell (reset, remote resync)
+    or have no previous position are drawn where they are now. They are
+    drawn head first, so overlapping segments stack the same way every frame.
+    """
+    points = view.visible_cells()
+    if prev_body and alpha < 1.0:
+        count = len(prev_body)
+        slid = []
+        for pos in points:
+            i = view.index(pos)
+            slid.append((i, interpolate_point(prev_body[i], pos, alpha) if i < count else pos))
+        slid.sort()
+        points = [point for _, point in slid]
+    draw_snake(surface, points, fill_color, outline_color)
+
+
+def interpolate_point(prev, pos, alpha):
+    """Position a fraction alpha of the way from prev to pos, or pos if it jumped."""
+    x, y = pos
+    px, py = prev
+    if abs(x - px) + abs(y - py) <= CELL:
+        return (round(px + (x - px) * alpha), round(py + (y - py) * alpha))
+    return pos
+
+
+def render_fruit_frames():
+    """One sprite per step of the fruit's pulse; frames that look the same share a surface."""
+    size = CELL + 6
+    centre = (3 + CELL // 2, 3 + CELL // 2)
+    frames = []
+    shared = {}
+    for i in range(FRUIT_PULSE_FRAMES):
+        pulse = (math.sin(2 * math.pi * i / FRUIT_PULSE_FRAMES) + 1) / 2  # 0..1
+
+        # BASE RADII + PULSE AMOUNT (GROW/SHRINK)
+        outer_r = CELL // 2 + int(2 * pulse)
+        inner_r = CELL // 3 + int(1 * pulse)
+
+        sprite = shared.get((outer_r, inner_r))
+        if sprite is None:
+            sprite = pygame.Surface((size, size), pygame.SRCALPHA)
+            # OUTER GLOW
+            pygame.draw.circle(sprite, FRUIT_GLOW, centre, outer_r)
+            # INNER GLOW
+            pygame.draw.circle(sprite, FRUIT_COLOR, centre, inner_r)
+            sprite = shared[(outer_r, inner_r)] = sprite.convert_alpha()
+        frames.append(sprite)
+    return frames
 
-    # BASE RADII
-    base_outer = CELL // 2
-    base_inner = CELL // 3
 
-    # PULSE AMOUNT (GROW/SHRINK)
-    outer_pulse = 2
-    inner_pulse = 1
+def draw_fruit(surface, pos):
+    global fruit_frames, fruit_frames_key
+    if not camera.visible(pos[0], pos[1], margin=3):
+        return
+    if fruit_frames is None or fruit_frames_key != CELL:
+        fruit_frames = render_fruit_frames()
+        fruit_frames_key = CELL
 
-    outer_r = base_outer + int(outer_pulse * pulse)
-    inner_r = base_inner + int(inner_pulse * pulse)
+    # TIME BASED: WHICH STEP OF THE PULSE WE ARE AT
+    phase = pygame.time.get_ticks() / (FRUIT_PULSE_MS * 2 * math.pi)
+    sprite = fruit_frames[int(phase * FRUIT_PULSE_FRAMES) % FRUIT_PULSE_FRAMES]
+    surface.blit(sprite, (pos[0] - camera.x - 3, pos[1] - camera.y - 3))
 
-    cx = pos[0] + CELL // 2
-    cy = pos[1] + CELL // 2
 
-    # OUTER GLOW
-    pygame.draw.circle(surface, FRUIT_GLOW, (cx, cy), outer_r)
-    # INNER GLOW
-    pygame.draw.circle(surface, FRUIT_COLOR, (cx, cy), inner_r)
+def fruit_area(pos):
+    """Screen area the fruit can cover at the peak of its pulse."""
+    return pygame.Rect(pos[0] - camera.x, pos[1] - camera.y, CELL, CELL).inflate(6, 6)
 
 
 def draw_center_text(surface, font, text, y_offset=0):
-    shadow = font.render(text, True, TEXT_SHADOW)
-    surf = font.render(text, True, TEXT_COLOR)
-    rect = surf.get_rect()
+    surf, rect = render_text(font, text, TEXT_COLOR)
     rect.center = (screen_width // 2, screen_height // 2 + y_offset)
-    surface.blit(shadow, (rect.x + 2, rect.y + 2))
     surface.blit(surf, rect)
 
 
 # === Network Functions ===
-def receive_messages(sock):
-    """Continuously receive messages from peer"""
-    global remote_snake_data, peer_connected, running, game_state, countdown_start_ms, paused_by, back_to_menu
-    buffer = ""
-    
-    while running:
+class NetworkThread:
+    """One asyncio event loop, on a daemon thread, doing all socket I/O.
+
+    Every connection, the listening socket and the UDP socket are served by
+    this loop, so nothing polls with timeouts and one thread handles any
+    number of links. The game loop talks to it through the links' outbound
+    queues (see PeerLink); inbound messages are only decoded on this thread
+    and handed to the game loop through `inbound` (see drain_inbound).
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def call(self, callback, *args):
+        """Run callback(*args) on the network thread soon (safe from any thread)."""
+        self.loop.call_soon_threadsafe(callback, *args)
+
+    def run(self, coro):
+        """Run a coroutine on the network thread and wait for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+
+network = NetworkThread()
+
+
+def receive(link, payload, received_at):
+    """Network thread: decode one message from `link` and queue it for the game
+    loop. Pings are answered here, so the reply times are not held up by a
+    slow frame; nothing else touches game state on this thread."""
+    msg = codec.decode(payload)
+    if msg.get('type') == 'ping':
+        # ANSWER RIGHT AWAY, WITH OUR RECEIVE + REPLY TIMES
+        link.send_control(codec.encode(
+            {'type': 'pong', 'id': msg['id'], 't0': msg['t0'],
+             't1': received_at, 't2': time.time()}))
+        return
+    # THE HOST PASSES SOME MESSAGES ON AS THEY ARRIVED (PAYLOAD VIEWS DO NOT OUTLIVE THIS CALL)
+    frame = codec.frame(payload) if is_host and msg.get('type') in RELAYED_TYPES + ('game_state',) else None
+    inbound.append((link, msg, frame, received_at))
+
+
+def link_lost(link):
+    """Network thread: a connection closed (either side, or an error)."""
+    inbound.append((link, None, None, time.time()))
+
+
+def drain_inbound():
+    """Apply everything the network thread queued since the last call, in
+    arrival order. The game loop calls this once per tick (and while waiting
+    for a match), so game state is only ever changed on the main thread."""
+    # ONLY WHAT IS QUEUED NOW: A FLOOD CANNOT KEEP US HERE
+    for _ in range(len(inbound)):
+        source, msg, frame, received_at = inbound.popleft()
+        if msg is None:
+            dropped_link(source)
+            continue
         try:
-            data = sock.recv(4096).decode('utf-8')
-            if not data:
-                print("Connection closed by peer")
-                peer_connected = False
-                break
-            
-            buffer += data
-            # Process complete JSON messages (separated by newlines)
-            while '\n' in buffer:
-                line, buffer = buffer.split('\n', 1)
-                if line.strip():
+            if not isinstance(source, PeerLink):
+                apply_datagram(source, msg, frame)
+            elif not source.quitting:
+                apply_message(source, msg, frame, received_at)
+        except (ValueError, KeyError, IndexError, struct.error):
+            # MALFORMED MESSAGE, SKIP IT
+            pass
+
+
+def apply_message(link, msg, frame, received_at):
+    """Apply one message received on `link`: to the host (player 1) for peers;
+    on the host, to a peer or spectator (link.player is None until a peer's
+    connect gives it a slot, and stays None for spectators).
+
+    The host also relays what peers send: their states go out with the next
+    world frame (see fan_out), and control messages and inputs are passed on
+    to everyone else unchanged. Spectators only get to ping, ask for a
+    keyframe and leave.
+    """
+    global peer_connected, countdown_start_ms, paused_by, back_to_menu, lockstep_seed
+    global local_player
+    player = link.player
+    msg_type = msg.get('type')
+    if is_host and player is None and msg_type != 'connect':
+        # SPECTATOR (OR NOT YET JOINED): NOTHING TO RELAY OR APPLY
+        if msg_type == 'keyframe_request' and link in spectators:
+            spectators[link] = True
+        elif msg_type == 'quit_to_menu':
+            link.leave()
+        return
+    if is_host and msg_type in ('game_state', 'input') and msg['player'] != player:
+        return  # A PEER ONLY SPEAKS FOR ITS OWN SNAKE
+    if is_host and msg_type in RELAYED_TYPES:
+        relay(frame, exclude=player)
+
+    if msg_type == 'game_state':
+        remote_states.append(msg)
+        if is_host:
+            relay_frames.append(frame)
+    elif msg_type == 'world':
+        remote_states.extend(state for state in msg['states']
+                             if state['player'] != local_player)
+    elif msg_type == 'pong':
+        if player in latencies:
+            latencies[player].add_sample(msg['t0'], msg['t1'], msg['t2'], received_at)
+    elif msg_type == 'input':
+        if lockstep:
+            lockstep.add(msg)
+    elif msg_type == 'keyframe_request':
+        # SOMEONE LOST TRACK OF OUR SNAKE, SEND IT WHOLE NEXT TICK
+        if state_encoder:
+            state_encoder.request_keyframe()
+    elif msg_type == 'connect':
+        if msg.get('version') != PROTOCOL_VERSION:
+            # INCOMPATIBLE GAME VERSION: DROP BACK TO THE MENU
+            print(f"Peer uses protocol version {msg.get('version')}, "
+                  f"we use {PROTOCOL_VERSION}")
+            if is_host:
+                # SEND OURS SO THEY CAN REPORT IT TOO
+                link.send_control(connect_message())
+                link.leave()
+                return
+            back_to_menu = True
+            peer_connected = False
+        elif bool(msg.get('lockstep')) != LOCKSTEP:
+            # BOTH SIDES MUST RUN THE SAME KIND OF SIMULATION
+            print("Peer has LOCKSTEP " + ("on" if msg.get('lockstep') else "off")
+                  + ", we do not")
+            if is_host:
+                link.send_control(connect_message())
+                link.leave()
+                return
+            back_to_menu = True
+            peer_connected = False
+        elif (msg.get('cols'), msg.get('rows')) != (WORLD_COLS, WORLD_ROWS):
+            # SNAKES AND FRUIT WOULD BE PLACED ON DIFFERENT BOARDS
+            print(f"Peer plays on a {msg.get('cols')} x {msg.get('rows')} arena, "
+                  f"we use {WORLD_COLS} x {WORLD_ROWS}")
+            if is_host:
+                link.send_control(connect_message())
+                link.leave()
+                return
+            back_to_menu = True
+            peer_connected = False
+        elif is_host:
+            if player is not None or link in spectators:
+                return  # REPEATED connect
+            if msg.get('spectator'):
+                if LOCKSTEP:
+                    # THEY COULD NOT FOLLOW A STREAM OF KEY PRESSES
+                    print("Spectators cannot watch a lockstep match")
+                    link.send_control(codec.encode({'type': 'quit_to_menu', 'by': local_player}))
+                    link.leave()
+                    return
+                link.watch()
+                spectators[link] = True
+                print(f"Spectator connected ({len(spectators)} watching)")
+                if match_started:
+                    link.send_control(connect_message(sorted(game.active)))
+                return
+            slot = next((p for p in range(2, MAX_PLAYERS + 1) if p not in peer_senders), None)
+            if slot is None or match_started:
+                print("Lobby is full, turning peer away")
+                link.send_control(codec.encode({'type': 'quit_to_menu', 'by': local_player}))
+                link.leave()
+                return
+            link.player = player = slot
+            add_peer(player, link, link.addr)
+            print(f"Peer connected: Player {player}")
+            use_peer_udp(player, msg.get('udp_port'))
+            if len(peer_senders) == MAX_PLAYERS - 1:
+                # LOBBY FULL
+                start_match()
+        else:
+            # THE HOST SAYS WHO IS PLAYING AND WHICH SNAKE IS OURS
+            local_player = None if spectating else msg.get('slot') or 2
+            setup_match(msg.get('players') or (1, 2))
+            use_peer_udp(player, msg.get('udp_port'))
+            if LOCKSTEP:
+                # USE THE HOST'S SEED SO FRUIT LANDS IN THE SAME PLACES
+                lockstep_seed = msg.get('seed') or 0
+            if spectating:
+                print("Watching match")
+            else:
+                print(f"Joined match as Player {local_player}")
+            peer_connected = True
+    elif msg_type == 'pause':
+        game.phase = STATE_PAUSED
+        by = msg.get('by')
+        if by:
+            paused_by = f"Player {by}"
+        else:
+            paused_by = "Peer"
+    elif msg_type == 'resume':
+        game.phase = STATE_RUNNING
+        paused_by = None
+    elif msg_type == 'reset':
+        # Peer requested a reset – sync our state
+        reset_game_state(new_round=True)
+        countdown_start_ms = pygame.time.get_ticks()
+    elif msg_type == 'quit_to_menu':
+        if is_host:
+            link.leave()
+            return
+        by = msg.get('by')
+        if by in (None, 1) or lockstep:
+            # HOST (OR, IN LOCKSTEP, ANYONE) LEFT: EVERYONE BACK TO MAIN MENU
+            back_to_menu = True
+            peer_connected = False
+        elif by < len(game.snakes) + 1:
+            # ANOTHER PLAYER LEFT, THE MATCH GOES ON WITHOUT THEM
+            game.drop_player(by)
+            remote_predictors.pop(by, None)
+
+
+def dropped_link(link):
+    """Apply a connection closing (either side, or an error)."""
+    global peer_connected
+    registered = link.player is not None and peer_senders.get(link.player) is link
+    if is_host:
+        # (A LINK FROM BEFORE close_connection() MUST NOT DROP A NEW MATCH'S PLAYER)
+        if registered:
+            peer_left(link.player, quit=link.quitting)
+        spectators.pop(link, None)
+    elif registered:
+        peer_connected = False
+
+
+def apply_datagram(addr, msg, frame):
+    """Apply a state (or world) datagram from addr, dropping stale and
+    duplicate copies (and, on the host, states for someone else's snake)."""
+    states = msg['states'] if msg.get('type') == 'world' else (msg,)
+    for state in states:
+        if state.get('type') != 'game_state' or state['player'] == local_player:
+            continue
+        if is_host:
+            sender = peer_senders.get(state['player'])
+            if sender is None or sender.udp_addr != addr:
+                continue
+        # OLDER THAN SOMETHING WE ALREADY HAVE (REORDERED / REPEATED COPY)
+        if state['seq'] <= udp_newest_seq.get(state['player'], 0):
+            continue
+        udp_newest_seq[state['player']] = state['seq']
+        remote_states.append(state)
+        if is_host:
+            relay_frames.append(frame)
+
+
+class StateDatagrams(asyncio.DatagramProtocol):
+    """Receives state datagrams from peers and queues them for the game loop."""
+
+    def datagram_received(self, data, addr):
+        if addr[0] not in peer_addrs.values():
+            return
+        try:
+            frames = [(payload, codec.decode(payload)) for payload in split_frames(data)]
+        except (ValueError, KeyError, IndexError, struct.error):
+            return
+        received_at = time.time()
+        for payload, msg in frames:
+            inbound.append((addr, msg, codec.frame(payload) if is_host else None, received_at))
+
+    def error_received(self, exc):
+        print(f"Error receiving datagram: {exc}")
+
+
+def open_udp(port):
+    """Bind the UDP state socket on the network thread. Returns the bound port."""
+    global udp_transport
+
+    async def bind():
+        return await network.loop.create_datagram_endpoint(StateDatagrams, local_addr=('0.0.0.0', port))
+
+    udp_transport, _ = network.run(bind())
+    return udp_transport.get_extra_info('sockname')[1]
+
+
+def use_peer_udp(player, udp_port):
+    """Start sending state to `player` over UDP if they offered a port and we have one too."""
+    link = peer_senders.get(player)
+    if udp_port and udp_transport and link:
+        link.use_udp(udp_transport, (peer_addrs[player], udp_port))
+
+
+class PeerLink(asyncio.BufferedProtocol):
+    """One TCP connection to a peer (or, on the host, to a peer or spectator).
+
+    Incoming bytes go straight into a FrameReader's buffer and every
+    complete frame is handed to receive(). Outgoing, control messages
+    wait in an ordered queue and are always delivered. Per-tick state is
+    latest-wins: there is a single slot, and a new snapshot replaces one
+    that has not gone out yet. A snapshot only goes out once the transport
+    has written everything before it to the socket (the write buffer limits
+    make asyncio pause us as soon as anything is left over), so a slow
+    receiver keeps the slot full instead of queueing old snapshots. Callers
+    check state_pending() first and send a keyframe in that case, so
+    dropping the older snapshot never leaves the peer with a broken delta
+    chain.
+
+    send_*(), state_pending() and close() may be called from any thread;
+    the writing itself happens on the network thread.
+    """
+
+    def __init__(self, player=None):
+        self.player = player
+        self.transport = None
+        self.addr = None
+        self.reader = FrameReader()
+        self.udp_transport = None
+        self.udp_addr = None
+        self.udp_packer = RedundantSender(UDP_REDUNDANCY, UDP_MAX_DATAGRAM)
+        self.lock = threading.Lock()  # GUARDS control / state / scheduled
+        self.control = deque()
+        self.state = None
+        self.scheduled = False  # A flush() IS ALREADY QUEUED ON THE NETWORK THREAD
+        self.paused = False  # TRANSPORT STILL HAS UNWRITTEN DATA
+        self.closing = False
+        self.quitting = False  # HOST: THEY QUIT OR WERE TURNED AWAY (NOT A DISCONNECT)
+
+    # --- asyncio callbacks (network thread) ---
+    def connection_made(self, transport):
+        self.transport = transport
+        self.addr = transport.get_extra_info('peername')[0]
+        transport.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        transport.set_write_buffer_limits(high=1, low=0)
+        if is_host:
+            print(f"Peer connected from {self.addr}")
+
+    def get_buffer(self, sizehint):
+        return self.reader.get_buffer(max(sizehint, 4096))
+
+    def buffer_updated(self, nbytes):
+        self.reader.received(nbytes)
+        received_at = time.time()
+        try:
+            # Process complete length-prefixed frames (views into the reader's buffer)
+            for payload in self.reader.frames():
+                if self.closing or self.quitting:
+                    break
+                if payload:
                     try:
-                        msg = json.loads(line)
-                        with data_lock:
-                            msg_type = msg.get('type') 
-                            if msg_type == 'game_state':
-                                remote_snake_data = msg
-                            elif msg_type == 'connect':
-                                peer_connected = True
-                                print(f"Peer connected: Player {msg.get('player_id')}")
-                            elif msg_type == 'pause':
-                                game_state = STATE_PAUSED
-                                sender = msg.get('by')
-                                if sender in (1, 2):
-                                    paused_by = f"Player {sender}"
-                                else:
-                                    paused_by = "Peer"
-                            elif msg_type == 'resume':
-                                game_state = STATE_RUNNING
-                                paused_by = None
-                            elif msg_type == 'reset':
-                                # Peer requested a reset – sync our state
-                                reset_game_state()
-                                game_state = STATE_COUNTDOWN
-                                countdown_start_ms = pygame.time.get_ticks()
-                            elif msg_type == 'quit_to_menu':
-                                # PEERS WANTS TO GO BACK TO MAIN MENU
-                                back_to_menu = True
-                                peer_connected = False
-                    except json.JSONDecodeError:
+                        receive(self, payload, received_at)
+                    except (ValueError, KeyError, IndexError, struct.error):
+                        # MALFORMED FRAME, SKIP IT
                         pass
-        except socket.timeout:
-            continue
-        except Exception as e:
-            if running:
-                print(f"Error receiving: {e}")
-            break
+        except ValueError as e:
+            # CORRUPT STREAM (IMPOSSIBLE FRAME LENGTH)
+            print(f"Error receiving: {e}")
+            self.close(flush=False)
+
+    def eof_received(self):
+        print("Connection closed by peer")
+        return False  # CLOSE OUR SIDE TOO
+
+    def connection_lost(self, exc):
+        if exc and not self.closing:
+            print(f"Error receiving: {exc}")
+        self.closing = True
+        link_lost(self)
+
+    def pause_writing(self):
+        self.paused = True
+
+    def resume_writing(self):
+        self.paused = False
+        self.flush()
+
+    # --- Sending ---
+    def use_udp(self, udp_transport, addr):
+        self.udp_transport = udp_transport
+        self.udp_addr = addr
+
+    def watch(self):
+        """Host: this link is a spectator. A small send buffer makes one that falls
+        behind fill its state slot soon instead of queueing seconds of old worlds."""
+        self.transport.get_extra_info('socket').setsockopt(
+            socket.SOL_SOCKET, socket.SO_SNDBUF, SPECTATOR_SEND_BUFFER)
+
+    def send_control(self, frame):
+        with self.lock:
+            if len(self.control) >= MAX_CONTROL_QUEUE:
+                # PEER STOPPED READING; GIVE UP ON IT
+                print("Peer is not reading, closing connection")
+                self.close(flush=False)
+                return
+            self.control.append(frame)
+            self.schedule()
+
+    def send_state(self, frame):
+        with self.lock:
+            self.state = frame
+            self.schedule()
+
+    def state_pending(self):
+        """True if the last state snapshot has not been written yet."""
+        return self.state is not None
+
+    def schedule(self):
+        """Queue one flush() on the network thread. Call with self.lock held."""
+        if not self.scheduled:
+            self.scheduled = True
+            network.call(self.flush)
+
+    def flush(self):
+        with self.lock:
+            self.scheduled = False
+            if self.closing or self.transport is None:
+                return
+            while self.control and not self.paused:
+                self.transport.write(self.control.popleft())
+            frame = None
+            if self.state is not None and not self.control:
+                if self.udp_addr and len(self.state) <= UDP_MAX_DATAGRAM:
+                    frame, self.state = self.state, None
+                    self.udp_transport.sendto(self.udp_packer.datagram(frame), self.udp_addr)
+                elif not self.paused:
+                    frame, self.state = self.state, None
+                    self.transport.write(frame)
+
+    def leave(self):
+        """Host: stop reading and drop this peer (they quit or were turned away)."""
+        self.quitting = True
+        self.close()
+
+    def close(self, flush=True):
+        """Close the connection; with flush, queued control messages go out first."""
+        network.call(self.shut, flush)
+
+    def shut(self, flush):
+        if self.closing or self.transport is None:
+            return
+        if flush:
+            with self.lock:
+                while self.control:
+                    self.transport.write(self.control.popleft())
+        self.closing = True
+        if flush:
+            self.transport.close()  # WRITES WHAT IS BUFFERED, THEN CLOSES
+        else:
+            self.transport.abort()
+
+
+def add_peer(player, link, addr):
+    """Register the link to `player`."""
+    peer_addrs[player] = addr
+    latencies[player] = LatencyEstimator()
+    peer_senders[player] = link
+
+
+def connect_message(players=None, slot=None):
+    """Host: our connect; with players it starts the match for the receiver."""
+    return codec.encode(
+        {'type': 'connect', 'version': PROTOCOL_VERSION, 'player_id': local_player,
+         'udp_port': host_udp_port, 'lockstep': LOCKSTEP, 'seed': lockstep_seed,
+         'players': players, 'slot': slot, 'cols': WORLD_COLS, 'rows': WORLD_ROWS})
+
+
+def relay(frame, exclude=None):
+    """Host: pass a frame on to every peer except `exclude` (who sent it), and
+    to every spectator."""
+    for player, link in list(peer_senders.items()):
+        if player != exclude:
+            link.send_control(frame)
+    for link in list(spectators):
+        link.send_control(frame)
+
+
+def peer_left(player, quit):
+    """Host: `player` quit (quit=True) or disconnected.
+
+    The rest play on without their snake. If nobody is left we go back to the
+    menu on a quit and to the waiting screen on a disconnect, as in a
+    two-player game; in lockstep everyone goes back to the menu, since the
+    others would wait for that player's inputs forever.
+    """
+    global peer_connected, back_to_menu
+    link = peer_senders.pop(player, None)
+    peer_addrs.pop(player, None)
+    latencies.pop(player, None)
+    if link:
+        link.close(flush=False)
+    if not match_started:
+        return
+    if not peer_senders or lockstep:
+        relay(codec.encode({'type': 'quit_to_menu', 'by': local_player}))
+        back_to_menu = quit or bool(lockstep)
+        peer_connected = False
+        return
+    game.drop_player(player)
+    remote_predictors.pop(player, None)
+    relay(codec.encode({'type': 'quit_to_menu', 'by': player}))
+
+
+def close_connection():
+    """Close every connection to / for the peers, the lobby and the UDP socket."""
+    global server, udp_transport, match_started, relay_frames
+    for link in list(peer_senders.values()) + list(spectators):
+        link.close()
+
+    async def close_sockets(closables):
+        for closable in closables:
+            closable.close()
+
+    # WAIT, SO HOSTING AGAIN RIGHT AWAY CAN BIND THE SAME PORTS
+    network.run(close_sockets([c for c in (server, udp_transport) if c]))
+    server = udp_transport = None
+    peer_senders.clear()
+    spectators.clear()
+    peer_addrs.clear()
+    latencies.clear()
+    inbound.clear()  # WHAT THE OLD LINKS SENT IS NO LONGER FOR US
+    relay_frames = []
+    match_started = False
+    stop_recording()
+
 
 # DEBUGGER FUNCTION
 def send_control_message(msg_type: str):
-    """Send a simple control message (e.g., pause, resume, reset) to peer."""
-    global client_socket, local_player
-    if client_socket and peer_connected:
+    """Send a simple control message (e.g., pause, resume, reset) to every peer."""
+    if peer_connected:
+        relay(codec.encode({'type': msg_type, 'by': local_player}))
+
+def start_state_sync():
+    """Fresh per-connection sync: delta streams start with a keyframe, no remote
+    history, new latency estimates, and an empty lockstep input buffer."""
+    global state_encoder, lockstep
+    state_encoder = DeltaEncoder(local_player)
+    remote_predictors.clear()
+    for player in latencies:
+        latencies[player] = LatencyEstimator()
+    lockstep = LockstepInputs(sorted(game.active), LOCKSTEP_DELAY) if LOCKSTEP else None
+    udp_newest_seq.clear()
+    start_recording()
+
+
+def start_recording():
+    """Record the match that is starting to a new file in REPLAY_DIR."""
+    global recorder
+    stop_recording()
+    if not REPLAY_DIR:
+        return
+    os.makedirs(REPLAY_DIR, exist_ok=True)
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    for attempt in itertools.count(1):
+        suffix = f"-{attempt}" if attempt > 1 else ""
+        path = os.path.join(REPLAY_DIR, f"match-{stamp}-p{local_player or 0}{suffix}.replay")
         try:
-            msg = json.dumps({'type': msg_type, 'by': local_player}) + '\n'
-            client_socket.sendall(msg.encode('utf-8'))
-        except Exception as e:
-            print(f"Error sending control message: {e}")
+            recorder = ReplayRecorder(path, game, snake_speed, local_player, LOCKSTEP)
+            break
+        except FileExistsError:
+            continue
+    print(f"Recording replay to {path}")
+
+
+def stop_recording():
+    global recorder
+    if recorder:
+        recorder.close()
+        recorder = None
+
+
+def send_ping():
+    """Probe round-trip times; each peer answers with a pong (see LatencyEstimator)."""
+    global next_ping_id, last_ping_time
+    if peer_connected:
+        next_ping_id += 1
+        last_ping_time = time.time()
+        frame = codec.encode({'type': 'ping', 'id': next_ping_id, 't0': last_ping_time})
+        for link in list(peer_senders.values()):
+            link.send_control(frame)
+
+
+def network_stats():
+    """Latency estimates (ms) for our slowest link, or None until a pong arrives."""
+    stats = [s for s in (estimator.stats() for estimator in list(latencies.values())) if s]
+    return max(stats, key=lambda s: s['rtt_ms']) if stats else None
+
 
 def send_game_state():
-    """Send local snake state to peer"""
-    global client_socket, game_state
-    
-    if client_socket and peer_connected:
-        if local_player == 1:
-            state = {
-                'type': 'game_state',
-                'player': 1,
-                'pos': snake1_pos,
-                'body': snake1_body,
-                'direction': snake1_direction,
-                'score': snake1_score,
-                'fruit_pos': fruit_pos if is_host else None
-            }
+    """Send local snake state to peers (a delta, or a keyframe when due)"""
+    global eaten_fruit
+    if peer_senders and peer_connected:
+        snake = game.snake(local_player)
+        # PREVIOUS SNAPSHOT STILL UNSENT: IT WILL BE REPLACED, SO SEND A FULL ONE
+        if any(link.state_pending() for link in list(peer_senders.values())):
+            state_encoder.request_keyframe()
+        state = state_encoder.encode(snake)
+        if is_host:
+            state['fruit_pos'] = game.fruit_pos
         else:
-            # FOR CLIENT (P2), ALSO TELL HOST IF WE ATE FRUIT  
-            ate = (list(snake2_pos) == fruit_pos and game_state == STATE_RUNNING)
-            state = {
-                'type': 'game_state',
-                'player': 2,
-                'pos': snake2_pos,
-                'body': snake2_body,
-                'direction': snake2_direction,
-                'score': snake2_score,
-                "ate_fruit": ate
-            }
+            # FOR CLIENTS, ALSO TELL HOST WHICH FRUIT WE ATE. EVERY STATE REPEATS IT
+            # UNTIL THE HOST RESPAWNS THE FRUIT: A STATE CAN BE REPLACED BEFORE IT IS
+            # SENT (LATEST WINS) OR LOST (UDP)
+            if snake.pos == game.fruit_pos and game.phase == STATE_RUNNING:
+                eaten_fruit = game.fruit_pos
+            state['ate_fruit'] = eaten_fruit
         
-        try:
-            msg = json.dumps(state) + '\n'
-            client_socket.sendall(msg.encode('utf-8'))
-        except Exception as e:
-            print(f"Error sending: {e}")
+        frame = codec.encode(state)
+        if is_host:
+            fan_out(frame)
+        else:
+            peer_senders[1].send_state(frame)
+
+
+def fan_out(frame=None):
+    """Host: send this tick's states, ours (frame) and every peer's, to all
+    peers and spectators.
+
+    Peers' frames are relayed as they arrived, and everything goes into one
+    world frame that is encoded once and handed to each receiver's sender, so
+    the per-tick cost grows linearly with the number of players and viewers.
+    Each peer skips its own entry. A spectator that fell behind (its last
+    world still unsent, or it asked for a resync) gets a keyframe world
+    instead, so a slow viewer skips ahead and never holds up the game.
+    """
+    global relay_frames
+    frames, relay_frames = relay_frames, []
+    watchers = list(spectators.items())
+    for link in spectators:
+        spectators[link] = False
+    own = [frame] if frame is not None else []
+    world = world_frame(own + frames)
+    for link in list(peer_senders.values()):
+        if len(peer_senders) > 1:
+            link.send_state(world)
+        elif own:
+            link.send_state(own[0])  # TWO PLAYERS: THE PEER ONLY NEEDS OURS
+
+    resync = None
+    for link, behind in watchers:
+        if behind or link.state_pending():
+            if resync is None:
+                resync = keyframe_world(frames)
+            link.send_state(resync)
+        elif world is not None:
+            link.send_state(world)
+
+
+def world_frame(frames):
+    """One frame carrying the given state frames (None if there are none)."""
+    if not frames:
+        return None
+    return frames[0] if len(frames) == 1 else codec.encode_world(game.tick, frames)
+
+
+def keyframe_world(relayed):
+    """Host: a world frame with every snake as a keyframe at its newest sequence
+    number, followed by this tick's relayed states (deltas newer than a
+    keyframe apply on top of it, older ones are dropped as duplicates)."""
+    states = []
+    if state_encoder:
+        states.append(keyframe(local_player, state_encoder.seq, game.snake(local_player), game.fruit_pos))
+    for player in sorted(game.active):
+        predictor = remote_predictors.get(player)
+        if predictor and predictor.decoder.seq is not None:
+            states.append(keyframe(player, predictor.decoder.seq, predictor.auth))
+    return codec.encode_world(game.tick, [codec.encode(state) for state in states] + relayed)
+
+
+def remote_predictor(player):
+    predictor = remote_predictors.get(player)
+    if predictor is None:
+        predictor = remote_predictors[player] = RemotePredictor(game, player, MAX_PREDICT_TICKS)
+    return predictor
+
+
+def prediction_lead():
+    """Ticks the peer is probably ahead of its newest message: the tick it
+    spent sending plus the one-way trip (half the smoothed RTT)."""
+    stats = network_stats()
+    one_way_ms = stats['rtt_ms'] / 2 if stats else 0.0
+    return 1 + int(round(one_way_ms * snake_speed / 1000.0))
+
+
+def prediction_stats():
+    """PLAYER -> RemotePredictor.stats() for every remote snake."""
+    return {player: predictor.stats() for player, predictor in remote_predictors.items()}
 
 
 def update_remote_snake():
-    """Update the remote snake from received data"""
-    global snake1_pos, snake1_body, snake1_direction, snake1_score
-    global snake2_pos, snake2_body, snake2_direction, snake2_score
-    global fruit_pos, fruit_spawn, is_host
-    
-    with data_lock:
-        if remote_snake_data:
-            if remote_snake_data['player'] == 1:
-                snake1_pos = remote_snake_data['pos']
-                snake1_body = remote_snake_data['body']
-                snake1_direction = remote_snake_data['direction']
-                snake1_score = remote_snake_data['score']
-                if remote_snake_data.get('fruit_pos'):
-                    fruit_pos = remote_snake_data['fruit_pos']
-            else:
-                snake2_pos = remote_snake_data['pos']
-                snake2_body = remote_snake_data['body']
-                snake2_direction = remote_snake_data['direction']
-                snake2_score = remote_snake_data['score']
-                # ON HOST, MAKE SURE WE RESPAWN FRUIT IF P2 ATE
-                if is_host:
-                    ate_flag = remote_snake_data.get('ate_fruit', False)
-                    # CHECK POSITION MATCH
-                    if ate_flag or list(snake2_pos) == fruit_pos:
-                        fruit_spawn = False
+    """Apply every state message received since the last tick to the remote
+    snake, then place it where it most likely is now (see RemotePredictor)"""
+    global remote_states, eaten_fruit
+
+    pending, remote_states = remote_states, []
+
+    for msg in pending:
+        player = msg['player']
+        if not 1 <= player <= len(game.snakes) or player == local_player:
+            continue  # NOT A REMOTE SNAKE IN THIS MATCH
+        predictor = remote_predictor(player)
+        snake = predictor.auth
+        if not predictor.apply(msg):
+            send_control_message('keyframe_request')
+
+        if player == 1:
+            if msg.get('fruit_pos'):
+                game.fruit_pos = tuple(msg['fruit_pos'])
+                if game.fruit_pos != eaten_fruit:
+                    eaten_fruit = None  # THE HOST HAS MOVED ON
+        else:
+            # ON HOST, MAKE SURE WE RESPAWN FRUIT IF P2 ATE
+            if is_host:
+                # ONLY THE FRUIT THEY ATE (REPEATS OF AN OLD REPORT ARE IGNORED),
+                # OR THEIR REPORTED (NOT PREDICTED) HEAD ON IT
+                eaten = msg.get('ate_fruit')
+                if (eaten and tuple(eaten) == game.fruit_pos) or snake.pos == game.fruit_pos:
+                    game.fruit_spawn = False
+
+    predict = PREDICT_REMOTE and game.phase == STATE_RUNNING
+    lead = prediction_lead()
+    for predictor in remote_predictors.values():
+        predictor.advance(lead, predict)
 
 
 def init_host(port=8468):
-    """Initialize as host (Player 1)"""
-    global server_socket, client_socket, is_host, local_player, peer_connected, host_ip_text
+    """Initialize as host (Player 1) and open the lobby for up to MAX_PLAYERS - 1 peers"""
+    global server, is_host, local_player, peer_connected, host_ip_text
+    global lockstep_seed, host_udp_port, spectating
     
     is_host = True
+    spectating = False
     local_player = 1
+    lockstep_seed = random.getrandbits(32) if LOCKSTEP else 0
+    host_udp_port = open_udp(port) if USE_UDP else 0
     
     print(f"Starting host on port {port}...")
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     server_socket.bind(('0.0.0.0', port))
-    server_socket.listen(1)
-    server_socket.settimeout(1.0)
+    server_socket.listen(MAX_PLAYERS)
     
     # Get local IP
     hostname = socket.gethostname()
@@ -317,38 +1147,46 @@ def init_host(port=8468):
     print(f"Host started!")
     print(f"Local IP: {local_ip}")
     print(f"Port: {port}")
-    print("Waiting for peer to connect...")
+    print("Waiting for peers to connect...")
     
-    # Wait for connection in separate thread
-    def accept_connection():
-        global client_socket, peer_connected
-        while running and not peer_connected:
-            try:
-                client_socket, addr = server_socket.accept()
-                client_socket.settimeout(1.0)
-                print(f"Peer connected from {addr}")
-                
-                # Send connection confirmation
-                connect_msg = json.dumps({'type': 'connect', 'player_id': 1}) + '\n'
-                client_socket.sendall(connect_msg.encode('utf-8'))
-                peer_connected = True
-                
-                # Start receiving thread
-                recv_thread = threading.Thread(target=receive_messages, args=(client_socket,), daemon=True)
-                recv_thread.start()
-                break
-            except socket.timeout:
-                continue
-            except Exception as e:
-                if running:
-                    print(f"Error accepting connection: {e}")
-                break
-    
-    accept_thread = threading.Thread(target=accept_connection, daemon=True)
-    accept_thread.start()
+    # Accept connections on the network thread (spectators can join at any time;
+    # a peer's connect says whether it plays or watches)
+    async def accept_connections():
+        return await network.loop.create_server(PeerLink, sock=server_socket)
+
+    server = network.run(accept_connections())
+
+
+def setup_match(players):
+    """Size the board for the given player numbers (the host decides, peers
+    follow its connect message)."""
+    global game, renderer
+    game = make_game(max(players))
+    game.active = set(players)
+    prev_bodies[:] = [[] for _ in game.snakes]
+    remote_predictors.clear()
+    renderer = DirtyRenderer()
+
+
+def start_match():
+    """Host: close the lobby and tell every peer who is playing and which snake
+    is theirs (and spectators who is playing)."""
+    global match_started, peer_connected
+    if match_started or not peer_senders:
+        return
+    players = [local_player] + sorted(peer_senders)
+    setup_match(players)
+    for slot, link in peer_senders.items():
+        link.send_control(connect_message(players, slot))
+    for link in spectators:
+        link.send_control(connect_message(players))
+    match_started = True
+    peer_connected = True
+    print(f"Match started with {len(players)} players")
+
 
 def host_wait_screen():
-    """Show waiting screen for host until peer connects or ESC is pressed."""
+    """Show waiting screen for host until the match starts or ESC is pressed."""
     global running, host_ip_text, peer_connected
 
     waiting = True
@@ -361,72 +1199,114 @@ def host_wait_screen():
                 if event.key == pygame.K_ESCAPE:
                     # HOST CANCELS AND RETURNS TO MENU 
                     return False  
+                if event.key == pygame.K_RETURN:
+                    # START WITHOUT WAITING FOR A FULL LOBBY
+                    start_match()
+        drain_inbound()
 
         # DRAW UI
         draw_background(screen)
         draw_center_text(screen, FONT_TITLE, "HOSTING GAME", y_offset=-80)
-        draw_center_text(screen, FONT_SUB, "Waiting for Player 2 to connect...", y_offset=-20)
+        if MAX_PLAYERS > 2:
+            joined = len(peer_senders) + 1
+            draw_center_text(screen, FONT_SUB, f"Players: {joined} / {MAX_PLAYERS}", y_offset=-20)
+        else:
+            draw_center_text(screen, FONT_SUB, "Waiting for Player 2 to connect...", y_offset=-20)
 
         if host_ip_text:
             draw_center_text(screen, FONT_STATUS, f"Your IP: {host_ip_text}", y_offset=40)
 
-        draw_center_text(screen, FONT_STATUS, "Press ESC to cancel", y_offset=90)
+        if MAX_PLAYERS > 2 and peer_senders:
+            draw_center_text(screen, FONT_STATUS, "Press ENTER to start, ESC to cancel", y_offset=90)
+        else:
+            draw_center_text(screen, FONT_STATUS, "Press ESC to cancel", y_offset=90)
 
         pygame.display.update()
         fps.tick(20)
 
-    return True  # Peer connected, continue into game
+    return True  # Match started, continue into game
 
 
-def init_client(host_ip, host_port=8468):
-    """Initialize as client (Player 2)"""
-    global client_socket, is_host, local_player, peer_connected
+def init_client(host_ip, host_port=8468, spectate=False):
+    """Initialize as client; the host assigns our player number when the match
+    starts. With spectate=True we only watch and take no player slot."""
+    global is_host, local_player, peer_connected, spectating
     
     is_host = False
-    local_player = 2
+    spectating = spectate
+    local_player = None
     
     print(f"Connecting to {host_ip}:{host_port}...")
-    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    client_socket.settimeout(5.0)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.settimeout(5.0)
     
     try:
-        client_socket.connect((host_ip, host_port))
-        client_socket.settimeout(1.0)
+        sock.connect((host_ip, host_port))
         print("Connected to host!")
-        
+        # (SPECTATORS GET THEIR STREAM OVER TCP, SO A RESYNC IS NEVER LOST)
+        udp_port = open_udp(0) if USE_UDP and not spectate else 0
+
+        # Hand the socket to the network thread (peer_connected is set by the host's connect)
+        async def attach():
+            _, link = await network.loop.create_connection(lambda: PeerLink(1), sock=sock)
+            return link
+
+        link = network.run(attach())
+        add_peer(1, link, link.addr)
+
         # Send connection message
-        connect_msg = json.dumps({'type': 'connect', 'player_id': 2}) + '\n'
-        client_socket.sendall(connect_msg.encode('utf-8'))
-        peer_connected = True
-        
-        # Start receiving thread
-        recv_thread = threading.Thread(target=receive_messages, args=(client_socket,), daemon=True)
-        recv_thread.start()
+        link.send_control(codec.encode(
+            {'type': 'connect', 'version': PROTOCOL_VERSION, 'player_id': 0,
+             'udp_port': udp_port, 'lockstep': LOCKSTEP, 'spectator': spectate,
+             'cols': WORLD_COLS, 'rows': WORLD_ROWS}))
     except Exception as e:
         print(f"Error connecting: {e}")
-        client_socket = None
+        sock.close()
         raise
 
 
+# === HUD Labels ===
+def blit_labels(surface, labels):
+    for surf, rect in labels:
+        surface.blit(surf, rect)
+
+
+def title_labels():
+    title_surf, title_rect = render_text(FONT_TITLE, "P2P Versus Snake", TEXT_COLOR)
+    title_rect.topleft = (screen_width//2 - title_rect.width//2, 18)
+    return [(title_surf, title_rect)]
+
+
 # === Score display ===
-def show_score():
+def score_labels():
+    """P1 at the left edge, the last player at the right edge, the rest spread between."""
     font = FONT_SCORE
-    s1 = font.render('P1: ' + str(snake1_score), True, TEXT_COLOR)
-    s2 = font.render('P2: ' + str(snake2_score), True, TEXT_COLOR)
+    labels = []
+    last = len(game.snakes) - 1
+    for i, snake in enumerate(game.snakes):
+        surf, rect = render_text(font, f'P{snake.player}: {snake.score}', TEXT_COLOR, shadow_offset=1)
+        if i == 0:
+            rect.topleft = (10, 45)
+        elif i == last:
+            rect.topright = (screen_width - 10, 45)
+        else:
+            rect.midtop = (10 + (screen_width - 20) * i // last, 45)
+        labels.append((surf, rect))
+    return labels
 
-    screen.blit(font.render('P1: ' + str(snake1_score), True, TEXT_SHADOW), (11, 46))
-    screen.blit(s1, (10, 45))
 
-    x2 = screen_width - 10 - s2.get_width()
-    screen.blit(font.render('P2: ' + str(snake2_score), True, TEXT_SHADOW), (x2 + 1, 46))
-    screen.blit(s2, (x2, 45))
+def show_score(surface):
+    blit_labels(surface, score_labels())
 
 
 # === Connection Status Display ===
-def show_connection_status():
+def connection_status_labels():
     # text + color
-    if peer_connected:
-        status = "Connected"
+    if replaying:
+        status = "Replay"
+        color = (100, 255, 120)
+    elif peer_connected:
+        status = "Watching" if spectating else "Connected"
         color = (100, 255, 120)
     else:
         if is_host:
@@ -435,88 +1315,417 @@ def show_connection_status():
             status = "Connecting to host..."
         color = (255, 220, 100)
 
+    stats = network_stats() if peer_connected else None
+    if stats:
+        status += (f"  |  RTT {stats['rtt_ms']:.0f} ms  jitter {stats['jitter_ms']:.0f} ms"
+                   f"  clock offset {stats['clock_offset_ms']:+.0f} ms")
+
     # FIRST LINE (STATUS)
-    shadow = FONT_STATUS.render(status, True, TEXT_SHADOW)
-    surf = FONT_STATUS.render(status, True, color)
-    rect = surf.get_rect()
+    surf, rect = render_text(FONT_STATUS, status, color, shadow_offset=1)
     rect.midtop = (screen_width // 2, 5)
-    screen.blit(shadow, (rect.x + 1, rect.y + 1))
-    screen.blit(surf, rect)
+    labels = [(surf, rect)]
 
     # SECOND LINE: SHOW IP, ONLY FOR HOST WHILE WAITING
     if is_host and not peer_connected and host_ip_text:
         ip_label = f"Your IP: {host_ip_text}"
-        ip_surf_shadow = FONT_STATUS.render(ip_label, True, TEXT_SHADOW)
-        ip_surf = FONT_STATUS.render(ip_label, True, TEXT_COLOR)
-        ip_rect = ip_surf.get_rect()
+        ip_surf, ip_rect = render_text(FONT_STATUS, ip_label, TEXT_COLOR, shadow_offset=1)
         ip_rect.midtop = (screen_width // 2, 22) 
-        screen.blit(ip_surf_shadow, (ip_rect.x + 1, ip_rect.y + 1))
-        screen.blit(ip_surf, ip_rect)
+        labels.append((ip_surf, ip_rect))
+
+    return labels
 
 
-def draw_controls():
+def show_connection_status(surface):
+    blit_labels(surface, connection_status_labels())
+
+
+def controls_labels():
     text = "P1: WASD   P2: Arrows   P: Pause   R: Reset   ESC: Quit"
-    shadow = FONT_STATUS.render(text, True, TEXT_SHADOW)
-    surf = FONT_STATUS.render(text, True, TEXT_COLOR)
-    rect = surf.get_rect()
+    surf, rect = render_text(FONT_STATUS, text, TEXT_COLOR, shadow_offset=1)
     rect.midbottom = (screen_width // 2, screen_height - 6)
-    screen.blit(shadow, (rect.x + 1, rect.y + 1))
-    screen.blit(surf, rect)
+    return [(surf, rect)]
+
+
+def draw_controls(surface):
+    blit_labels(surface, controls_labels())
+
+
+# === Frame Timing Overlay ===
+def profile_labels():
+    """p50 / p95 / max ms per loop phase, under the scores (while show_profile)."""
+    if not show_profile:
+        return []
+    stats = profiler.stats(max_age=0.5)
+    lines = [f"{'phase':<8}{'p50':>7}{'p95':>7}{'max':>7} ms"]
+    for phase in ('frame',) + PHASES:
+        if phase in stats:
+            s = stats[phase]
+            lines.append(f"{phase:<8}{s['p50']:7.2f}{s['p95']:7.2f}{s['max']:7.1f}")
+    labels = []
+    y = 72
+    for line in lines:
+        surf, rect = render_text(FONT_STATUS, line, TEXT_COLOR, shadow_offset=1)
+        rect.topleft = (10, y)
+        labels.append((surf, rect))
+        y += rect.height + 1
+    return labels
+
+
+def show_profile_overlay(surface):
+    blit_labels(surface, profile_labels())
+
+
+def hud_labels():
+    """Every HUD label drawn over the board during play, in paint order."""
+    return (title_labels() + score_labels() + connection_status_labels() + controls_labels()
+            + profile_labels())
+
+
+# === Frame Drawing ===
+def draw_overlays(surface):
+    """Overlays for countdown / pause / game over."""
+    if game.phase == STATE_COUNTDOWN:
+        now = pygame.time.get_ticks()
+        elapsed = (now - countdown_start_ms) / 1000.0
+        remaining = max(0.0, COUNTDOWN_SECONDS - elapsed)
+        if remaining > 0.5:
+            num = int(remaining) + 1
+            msg = str(num)
+        else:
+            msg = "GO!"
+        draw_center_text(surface, FONT_COUNTDOWN, msg, y_offset=-10)
+        draw_center_text(surface, FONT_SUB, "Round starting...", y_offset=40)
+
+    elif game.phase == STATE_PAUSED:
+        draw_center_text(surface, FONT_COUNTDOWN, "PAUSED", y_offset=-10)
+        info = f"{paused_by} paused the game" if paused_by else "Game paused"
+        draw_center_text(surface, FONT_SUB, info, y_offset=40)
+        draw_center_text(surface, FONT_SUB, "Press P to resume or R to reset", y_offset=80)
+
+    elif game.phase == STATE_GAME_OVER:
+        # SHOW WINNER AND OPTIONS
+        title = f"Player {game.winner} Wins!" if game.winner else "Draw!"
+        draw_center_text(surface, FONT_COUNTDOWN, title, y_offset=-10)
+        draw_center_text(surface, FONT_SUB,
+                         "Press R for rematch or ESC for main menu",
+                         y_offset=40)
+
+
+def update_camera(alpha=1.0):
+    """Centre the camera on our snake's head, where it is drawn this frame."""
+    player = local_player or 1
+    snake = game.snake(player)
+    if not snake.body:
+        return
+    head = snake.pos
+    prev_body = prev_bodies[player - 1]
+    if prev_body and alpha < 1.0:
+        head = interpolate_point(prev_body[0], head, alpha)
+    camera.follow(head)
+
+
+def draw_scene(surface, alpha=1.0):
+    """Paint the whole game frame: board, snakes, fruit, HUD and overlays.
+
+    alpha is how far real time has moved into the current logic tick; it only
+    matters when INTERPOLATE is on.
+    """
+    draw_background(surface)
+    blit_labels(surface, title_labels())
+
+    sync_snake_views()
+    for view, prev_body, (fill, outline) in zip(snake_views, prev_bodies, itertools.cycle(PLAYER_COLORS)):
+        draw_snake_view(surface, view, prev_body, alpha, fill, outline)
+    draw_fruit(surface, game.fruit_pos)
+
+    # HUD
+    show_score(surface)
+    show_connection_status(surface)
+    draw_controls(surface)
+    show_profile_overlay(surface)
+
+    draw_overlays(surface)
+
+
+class SnakeView:
+    """The renderer's copy of one snake: its body and a segment count per cell.
+
+    sync() brings it up to date and reports which cells became or stopped
+    being occupied. Between resets and keyframes a snake's body is one deque
+    that only changes at its ends (push_head / pop_tail and the predictor's
+    undo), so only the ends are compared and walked: a frame where nothing
+    moved (same Snake.edits) costs O(1) and a tick O(SYNC_WINDOW + cells
+    that changed), however long the snake is. A new body (reset, keyframe)
+    or ends that moved more than SYNC_WINDOW cells are copied in full.
+
+    visible_cells() keeps the occupied cells around the camera view the same
+    way, so drawing costs O(window), not O(snake length).
+    """
+
+    SYNC_WINDOW = 32
+
+    def __init__(self):
+        self.source = None  # THE BODY DEQUE WE MIRROR
+        self.edits = None  # ITS SNAKE'S edits WHEN WE LAST SYNCED
+        self.body = deque()
+        self.cells = {}  # (x, y) -> SEGMENTS ON IT
+        self.serials = {}  # (x, y) -> SERIALS OF ITS SEGMENTS, TAIL END FIRST
+        self.head = 0  # SERIAL OF body[0]; SEGMENT i HAS SERIAL head - i
+        self.shown = set()  # OCCUPIED CELLS INSIDE shown_box
+        self.shown_box = None  # (left, top, right, bottom) WORLD PIXELS, RIGHT / BOTTOM EXCLUSIVE
+        self.shown_key = None  # CAMERA CELL AND WINDOW SIZE shown WAS BUILT FOR
+
+    def sync(self, snake):
+        """Catch up with snake's body; returns the set of cells whose occupancy changed."""
+        body = snake.body
+        if body is self.source:
+            if snake.edits == self.edits:
+                return set()  # NOTHING MOVED SINCE LAST TIME
+            self.edits = snake.edits
+            moved = self.catch_up(body)
+            if moved is not None:
+                return self.apply(*moved)
+        # NEW BODY: COPY IT
+        old = self.cells
+        self.source = body
+        self.edits = snake.edits
+        self.body = deque(body)
+        self.cells = {}
+        self.serials = {}
+        self.head = 0
+        for i, pos in enumerate(reversed(self.body), 1 - len(self.body)):
+            self.cells[pos] = self.cells.get(pos, 0) + 1
+            self.serials.setdefault(pos, []).append(i)
+        self.shown_key = None
+        return old.keys() ^ self.cells.keys()
+
+    def catch_up(self, body):
+        """Move our copy's ends to match body. Returns the (added, removed)
+        cells, or None if they cannot be matched within SYNC_WINDOW."""
+        mine = self.body
+        serials = self.serials
+        window = self.SYNC_WINDOW
+        if not mine or not body or abs(len(body) - len(mine)) > 2 * window:
+            return None
+        added, removed = [], []
+        if mine[0] != body[0]:
+            # NEWEST CELL BOTH STILL HAVE: OUR HEADS BEFORE IT WERE POPPED, THEIRS PUSHED
+            theirs = {}
+            for j in range(min(window, len(body))):
+                theirs.setdefault(body[j], j)
+            for i in range(min(window, len(mine))):
+                j = theirs.get(mine[i])
+                if j is not None:
+                    break
+            else:
+                return None
+            for _ in range(i):
+                pos = mine.popleft()
+                self.forget(pos, -1)
+                self.head -= 1
+                removed.append(pos)
+            for k in range(j - 1, -1, -1):
+                pos = body[k]
+                mine.appendleft(pos)
+                self.head += 1
+                serials.setdefault(pos, []).append(self.head)
+                added.append(pos)
+        extra = len(body) - len(mine)
+        for k in range(extra, 0, -1):
+            pos = body[-k]
+            serials.setdefault(pos, []).insert(0, self.head - len(mine))
+            mine.append(pos)
+            added.append(pos)
+        for _ in range(-extra):
+            pos = mine.pop()
+            self.forget(pos, 0)
+            removed.append(pos)
+        # ONLY THE ENDS EVER CHANGE, SO MATCHING ENDS MEAN A MATCHING BODY
+        # (THIS CATCHES A HEAD LINED UP WITH THE WRONG COPY OF A REPEATED CELL)
+        ends = min(window, len(mine))
+        if (any(a != b for a, b in zip(itertools.islice(mine, ends), itertools.islice(body, ends)))
+                or any(a != b for a, b in zip(itertools.islice(reversed(mine), ends),
+                                             itertools.islice(reversed(body), ends)))):
+            return None
+        return added, removed
+
+    def forget(self, pos, end):
+        """Drop the serial at end (0 = tail side, -1 = head side) of pos's list."""
+        serials = self.serials[pos]
+        del serials[end]
+        if not serials:
+            del self.serials[pos]
+
+    def apply(self, added, removed):
+        """Update the counts; a cell emptied and then refilled is not a change."""
+        cells = self.cells
+        changed = set()
+        for pos in removed:
+            count = cells[pos] - 1
+            if count:
+                cells[pos] = count
+            else:
+                del cells[pos]
+                changed.add(pos)
+        for pos in added:
+            count = cells.get(pos, 0)
+            cells[pos] = count + 1
+            if not count:
+                if pos in changed:
+                    changed.remove(pos)
+                else:
+                    changed.add(pos)
+        if self.shown_key is not None:
+            left, top, right, bottom = self.shown_box
+            for pos in changed:
+                if pos in cells and left <= pos[0] < right and top <= pos[1] < bottom:
+                    self.shown.add(pos)
+                else:
+                    self.shown.discard(pos)
+        return changed
+
+    def index(self, pos):
+        """Body index of the segment on cell pos nearest the head, or None if it is empty."""
+        serials = self.serials.get(pos)
+        return None if serials is None else self.head - serials[-1]
+
+    def visible_cells(self):
+        """Occupied cells that may show in the camera view (one cell of margin
+        around it, for interpolation). Rebuilt only when the camera crosses a
+        cell boundary, from whichever is smaller: the snake or the view."""
+        col, row = camera.x // CELL, camera.y // CELL
+        key = (col, row, screen_width, screen_height)
+        if key != self.shown_key:
+            self.shown_key = key
+            left, top = (col - 1) * CELL, (row - 1) * CELL
+            right = (col + 2 - (-screen_width // CELL)) * CELL
+            bottom = (row + 2 - (-screen_height // CELL)) * CELL
+            self.shown_box = (left, top, right, bottom)
+            cells = self.cells
+            if len(cells) <= ((right - left) // CELL) * ((bottom - top) // CELL):
+                self.shown = {(x, y) for x, y in cells if left <= x < right and top <= y < bottom}
+            else:
+                self.shown = {pos for pos in itertools.product(range(left, right, CELL), range(top, bottom, CELL))
+                              if pos in cells}
+        return self.shown
+
+
+def sync_snake_views():
+    """Bring every snake's SnakeView up to date; returns each one's changed cells."""
+    if len(snake_views) != len(game.snakes):
+        snake_views[:] = [SnakeView() for _ in game.snakes]
+    return [view.sync(snake) for view, snake in zip(snake_views, game.snakes)]
+
+
+class DirtyRenderer:
+    """Repaints and flips only the screen regions that changed since last frame.
+
+    Snake cells come from the SnakeViews, so a normal tick only touches the
+    new head, the old tail, the pulsing fruit and any HUD label whose text
+    changed, and a frame between ticks costs nothing per snake segment.
+    Overlay states, camera moves and the first frame after invalidate()
+    fall back to a full repaint.
+    """
+
+    def __init__(self):
+        self.full = True
+        self.camera_pos = None
+        self.fruit_rect = None
+        self.labels = []
+
+    def invalidate(self):
+        """Force the next frame to be painted and flipped in full."""
+        self.full = True
+
+    def render(self, surface):
+        changes = sync_snake_views()
+        snakes = [(view.cells, fill, outline)
+                  for view, (fill, outline) in zip(snake_views, itertools.cycle(PLAYER_COLORS))]
+        fruit_rect = fruit_area(game.fruit_pos)
+        # THE WHOLE BLITTED SURFACE, DROP SHADOW INCLUDED (render_text()'S RECT IS THE TEXT ONLY)
+        labels = [(surf, surf.get_rect(topleft=rect.topleft)) for surf, rect in hud_labels()]
+
+        camera_pos = (camera.x, camera.y)
+        if self.full or game.phase != STATE_RUNNING or camera_pos != self.camera_pos:
+            draw_scene(surface)
+            pygame.display.update()
+            # LEAVING AN OVERLAY STATE NEEDS ONE MORE FULL FRAME TO CLEAR IT
+            self.full = game.phase != STATE_RUNNING
+        else:
+            dirty = [self.fruit_rect, fruit_rect]
+            for changed in changes:
+                for x, y in changed:
+                    if camera.visible(x, y):
+                        dirty.append(pygame.Rect(x - camera.x, y - camera.y, CELL, CELL))
+
+            old_labels = {(id(surf), tuple(rect)) for surf, rect in self.labels}
+            new_labels = {(id(surf), tuple(rect)) for surf, rect in labels}
+            dirty.extend(pygame.Rect(r) for _, r in old_labels ^ new_labels)
+
+            for rect in dirty:
+                self.repaint(surface, rect, snakes, labels)
+            pygame.display.update(dirty)
+
+        self.camera_pos = camera_pos
+        self.fruit_rect = fruit_rect
+        self.labels = labels
+
+    def repaint(self, surface, rect, snakes, labels):
+        """Redraw every layer that overlaps rect, clipped to rect."""
+        surface.set_clip(rect)
+        surface.blit(get_background(), rect, rect)
+
+        # CELLS UNDER rect, IN WORLD COORDINATES
+        x0 = (rect.left + camera.x) // CELL * CELL
+        y0 = (rect.top + camera.y) // CELL * CELL
+        for occupied, fill, outline in snakes:
+            for x in range(x0, rect.right + camera.x, CELL):
+                for y in range(y0, rect.bottom + camera.y, CELL):
+                    if (x, y) in occupied:
+                        surface.blit(segment_sprite(fill, outline), (x - camera.x, y - camera.y))
+
+        if rect.colliderect(fruit_area(game.fruit_pos)):
+            draw_fruit(surface, game.fruit_pos)
+        for surf, label_rect in labels:
+            if rect.colliderect(label_rect):
+                surface.blit(surf, label_rect)
+        surface.set_clip(None)
+
+
+renderer = DirtyRenderer()
 
 
 # === Reset Game State ===
-def reset_game_state():
-    global snake1_pos, snake1_body, snake1_direction, snake1_change_to, snake1_score
-    global snake2_pos, snake2_body, snake2_direction, snake2_change_to, snake2_score
-    global fruit_pos, fruit_spawn
-
-    # Snake 1
-    snake1_pos = [screen_width // 4, screen_height // 2]
-    snake1_pos[0] = (snake1_pos[0] // CELL) * CELL
-    snake1_pos[1] = (snake1_pos[1] // CELL) * CELL
-    snake1_body = [
-        [snake1_pos[0], snake1_pos[1]],
-        [snake1_pos[0] - CELL, snake1_pos[1]],
-        [snake1_pos[0] - 2*CELL, snake1_pos[1]],
-        [snake1_pos[0] - 3*CELL, snake1_pos[1]],
-    ]
-    snake1_direction = 'RIGHT'
-    snake1_change_to = snake1_direction
-    snake1_score = 0
-
-    # Snake 2
-    snake2_pos = [screen_width * 3 // 4, screen_height // 2]
-    snake2_pos[0] = (snake2_pos[0] // CELL) * CELL
-    snake2_pos[1] = (snake2_pos[1] // CELL) * CELL
-    snake2_body = [
-        [snake2_pos[0], snake2_pos[1]],
-        [snake2_pos[0] + CELL, snake2_pos[1]],
-        [snake2_pos[0] + 2*CELL, snake2_pos[1]],
-        [snake2_pos[0] + 3*CELL, snake2_pos[1]],
-    ]
-    snake2_direction = 'LEFT'
-    snake2_change_to = snake2_direction
-    snake2_score = 0
-
-    fruit_pos[:] = [
-        random.randrange(1, (screen_width // CELL)) * CELL,
-        random.randrange(1, (screen_height // CELL)) * CELL,
-    ]
-    fruit_spawn = True
-
-
-# === Game Over ===
-def game_over(winner=None):
-    """Enter game-over state and store winner; don't quit app."""
-    global game_state, game_winner, paused_by
-
-    game_state = STATE_GAME_OVER
-    paused_by = None
-
-    if winner:
-        game_winner = f"{winner} Wins!"
+def reset_game_state(new_round=False):
+    """Re-center snakes, scores and fruit, and go back to the countdown phase.
+
+    new_round is True for resets a player asked for (R key / peer's reset);
+    in lockstep both peers count those, and reseed the fruit RNG with the
+    shared seed and that count so the new match plays out identically.
+    Otherwise the fruit RNG gets a fresh seed, so the replay can note it.
+    """
+    global lockstep_direction, lockstep_sent_tick, eaten_fruit
+    eaten_fruit = None
+    if LOCKSTEP:
+        if lockstep and new_round:
+            lockstep.new_round()
+        match_round = lockstep.round if lockstep else 0
+        seed = lockstep_seed + (match_round << 32)
+        lockstep_direction = None
+        lockstep_sent_tick = -1
     else:
-        game_winner = "Draw!"
+        seed = random.getrandbits(32)
+    game.rng.seed(seed)
+    game.reset()
+    if recorder:
+        recorder.new_round(seed)
+    for prev_body in prev_bodies:
+        prev_body.clear()
+    for predictor in remote_predictors.values():
+        predictor.reset()
+    # OUR SNAKE JUMPED BACK TO ITS START, SO THE PEER NEEDS A FULL SNAPSHOT
+    if state_encoder:
+        state_encoder.request_keyframe()
 
 
 # === Main Menu ===
@@ -525,7 +1734,7 @@ def main_menu():
     global typed_ip  # input buffer for JOIN
     typed_ip = ""
     waiting = True
-    mode = "MAIN"   # "MAIN" or "JOIN"
+    mode = "MAIN"   # "MAIN", "JOIN" or "WATCH" (JOIN WITHOUT A SNAKE)
 
     while waiting:
         for event in pygame.event.get():
@@ -540,22 +1749,23 @@ def main_menu():
 
                         # SHOW WAIT SCREEN, IF CANCEL, RESTART MENU
                         if not host_wait_screen():
+                            close_connection()
                             return main_menu()
 
                         # IF PEER CONNECTS, LEAVE MENU AND START GAME
                         waiting = False
 
-                    elif event.key == pygame.K_j:
+                    elif event.key in (pygame.K_j, pygame.K_w):
                         # switch to IP entry screen
                         typed_ip = ""
-                        mode = "JOIN"
+                        mode = "JOIN" if event.key == pygame.K_j else "WATCH"
 
                     elif event.key == pygame.K_ESCAPE:
                         pygame.quit()
                         quit()
 
-                # -------- JOIN / IP ENTRY MODE --------
-                elif mode == "JOIN":
+                # -------- JOIN / WATCH IP ENTRY MODE --------
+                else:
                     if event.key == pygame.K_ESCAPE:
                         # go back to main menu
                         mode = "MAIN"
@@ -565,7 +1775,7 @@ def main_menu():
                         # try to connect
                         if typed_ip.strip() != "":
                             try:
-                                init_client(typed_ip.strip())
+                                init_client(typed_ip.strip(), spectate=(mode == "WATCH"))
                                 waiting = False   # success -> leave menu
                             except Exception as e:
                                 print(f"Failed to connect: {e}")
@@ -584,30 +1794,25 @@ def main_menu():
 
         if mode == "MAIN":
             # main menu UI
-            title = FONT_MENU_TITLE.render("P2P Snake Game", True, "white")
-            option1 = FONT_MENU_OPTION.render("Press H to HOST (Player 1)", True, "green")
-            option2 = FONT_MENU_OPTION.render("Press J to JOIN (Player 2)", True, "blue")
-
             # title + options with shadow
-            screen.blit(FONT_MENU_TITLE.render("P2P Snake Game", True, TEXT_SHADOW),
-                        (screen_width // 2 - 200 + 2, 100 + 2))
-            screen.blit(title, (screen_width // 2 - 200, 100))
+            title, _ = render_text(FONT_MENU_TITLE, "P2P Snake Game", "white")
+            option1, _ = render_text(FONT_MENU_OPTION, "Press H to HOST (Player 1)", "green")
+            option2, _ = render_text(FONT_MENU_OPTION, "Press J to JOIN (Player 2)", "blue")
+            option3, _ = render_text(FONT_MENU_OPTION, "Press W to WATCH a match", "gray")
 
-            screen.blit(FONT_MENU_OPTION.render("Press H to HOST (Player 1)", True, TEXT_SHADOW),
-                        (screen_width // 2 - 220 + 2, 250 + 2))
+            screen.blit(title, (screen_width // 2 - 200, 100))
             screen.blit(option1, (screen_width // 2 - 220, 250))
-
-            screen.blit(FONT_MENU_OPTION.render("Press J to JOIN (Player 2)", True, TEXT_SHADOW),
-                        (screen_width // 2 - 220 + 2, 300 + 2))
             screen.blit(option2, (screen_width // 2 - 220, 300))
+            screen.blit(option3, (screen_width // 2 - 220, 350))
 
-        elif mode == "JOIN":
+        else:
             # join / IP entry UI
-            draw_center_text(screen, FONT_MENU_TITLE, "JOIN GAME (Player 2)", y_offset=-100)
+            heading = "JOIN GAME (Player 2)" if mode == "JOIN" else "WATCH GAME"
+            draw_center_text(screen, FONT_MENU_TITLE, heading, y_offset=-100)
             draw_center_text(screen, FONT_SUB, "Enter Host IP Address:", y_offset=-40)
 
-            ip_surf = FONT_MENU_OPTION.render(typed_ip, True, TEXT_COLOR)
-            ip_rect = ip_surf.get_rect(center=(screen_width // 2, screen_height // 2))
+            ip_surf, ip_rect = render_text(FONT_MENU_OPTION, typed_ip, TEXT_COLOR, shadow_offset=0)
+            ip_rect.center = (screen_width // 2, screen_height // 2)
             screen.blit(ip_surf, ip_rect)
 
             draw_center_text(screen, FONT_STATUS, "ENTER = Connect   ESC = Back", y_offset=80)
@@ -616,110 +1821,192 @@ def main_menu():
         fps.tick(30)
 
 
+# === Simulation Tick ===
+def lockstep_step():
+    """One lockstep tick: send our input for a later tick, then move every
+    snake for this tick once every player's input for it is in (collisions
+    are checked by the caller)."""
+    global lockstep_direction, lockstep_sent_tick
+    if game.phase != STATE_RUNNING:
+        return
+
+    tick = game.tick
+    if lockstep_sent_tick < tick:
+        msg = lockstep.message(local_player, tick, lockstep_direction)
+        lockstep.add(msg)
+        relay(codec.encode(msg))
+        lockstep_direction = None
+        lockstep_sent_tick = tick
+
+    if not lockstep.ready(tick):
+        return  # STALL UNTIL THE PEER'S INPUT ARRIVES
+    inputs = lockstep.take(tick)
+    game.move(inputs)
+
+
+def game_tick():
+    """Advance the simulation by one fixed step (1 / snake_speed seconds)."""
+    global paused_by
+
+    # EVERYTHING THE PEERS SENT SINCE THE LAST TICK
+    drain_inbound()
+
+    # REMEMBER WHERE EVERY SEGMENT STARTED THIS TICK (FOR INTERPOLATION)
+    if INTERPOLATE:
+        for prev_body, snake in zip(prev_bodies, game.snakes):
+            prev_body[:] = snake.body
+
+    if time.time() - last_ping_time >= PING_INTERVAL:
+        send_ping()
+    profiler.lap('misc')
+
+    if spectating:
+        # NO SNAKE OF OUR OWN: JUST SHOW WHAT THE HOST STREAMS
+        update_remote_snake()
+        profiler.lap('remote')
+        game.check_collisions()
+        profiler.lap('collide')
+        if recorder:
+            recorder.record(game)
+            profiler.lap('record')
+        return
+
+    if lockstep:
+        # Both peers move both snakes and spawn fruit from the shared seed
+        lockstep_step()
+    else:
+        # Update remote snake state (always read network)
+        update_remote_snake()
+        profiler.lap('remote')
+
+        # --- Local player movement + collisions (only when RUNNING) ---
+        # Each peer only moves its own snake; the host handles fruit spawning
+        game.move(players=(local_player,), spawn_fruit=is_host)
+    profiler.lap('move')
+    ended = game.check_collisions()
+    profiler.lap('collide')
+    if ended:
+        paused_by = None
+
+    # Send local state to peer (during countdown + running so they see reset,
+    # and on the tick that ended the round so they see the final move)
+    if not lockstep and (ended or game.phase in (STATE_RUNNING, STATE_COUNTDOWN)):
+        send_game_state()
+    elif is_host:
+        # KEEP PASSING PEERS' STATES ON (AND RESYNCING SPECTATORS) WHILE OURS IS NOT BEING SENT
+        fan_out()
+    profiler.lap('send')
+
+    if recorder:
+        recorder.record(game)
+        profiler.lap('record')
+
+
 # === Main Function ===
 def main():
-    global snake1_pos, snake1_body, snake1_direction, snake1_change_to, snake1_score
-    global snake2_pos, snake2_body, snake2_direction, snake2_change_to, snake2_score
-    global fruit_pos, fruit_spawn, running, game_state, countdown_start_ms, connection_initialized, paused_by
-    global peer_connected, client_socket, server_socket, back_to_menu
+    global running, countdown_start_ms, connection_initialized, paused_by
+    global peer_connected, back_to_menu, lockstep_direction, show_profile
     
+    if PROFILE_LOG:
+        profiler.open_log(PROFILE_LOG)
+
     # Show menu and setup connection
     main_menu()
     # reset_game_state()
-    game_state = STATE_COUNTDOWN
+    game.phase = STATE_COUNTDOWN
     # countdown_start_ms = pygame.time.get_ticks()
     countdown_start_ms = 0      # WILL BE SET AFTER PEER CONNECTS
     connection_initialized = False
+
+    # Fixed timestep: logic advances snake_speed times a second, drawing and
+    # input polling run at RENDER_FPS.
+    tick_ms = 1000.0 / snake_speed
+    accumulator = 0.0
+    last_frame_ms = pygame.time.get_ticks()
     
     # Main game loop
     while running:
+        profiler.begin_frame()
+        now = pygame.time.get_ticks()
+        accumulator += min(now - last_frame_ms, MAX_FRAME_MS)
+        last_frame_ms = now
+
         # --- Handling key events ---
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
-                if client_socket:
-                    client_socket.close()
-                if server_socket:
-                    server_socket.close()
+                close_connection()
                 pygame.quit()
                 quit()
             elif event.type == pygame.KEYDOWN:
                 # ESC BEHAVIOR DEPENDS ON STATE
                 if event.key == pygame.K_ESCAPE:
-                    if game_state == STATE_RUNNING:
+                    if game.phase == STATE_RUNNING and not spectating:
                         # IGNORE WHILE GAME IN PROGRESS
                         pass
                     else:
                         # FROM PAUSED OR COUNTDOWN: RETURN BOTH PLAYERS TO MAIN MENU
                         if peer_connected:
                             send_control_message('quit_to_menu')
-                        if client_socket:
-                            client_socket.close()
-                            client_socket = None
-                        if server_socket:
-                            server_socket.close()
-                            server_socket = None
+                        close_connection()
                         peer_connected = False
                         back_to_menu = False 
 
                         # BACK TO MAIN MENU LOCALLY
                         main_menu()
                         reset_game_state()
-                        game_state = STATE_COUNTDOWN
                         countdown_start_ms = 0
                         connection_initialized = False
                         paused_by = None
                         continue  # SKIP ITERATION
 
+                # FRAME TIMING OVERLAY / cProfile CAPTURE (ALSO WHILE WATCHING)
+                if event.key == PROFILE_OVERLAY_KEY:
+                    show_profile = not show_profile
+                elif event.key == PROFILE_CAPTURE_KEY:
+                    path = f"profile-{time.strftime('%Y%m%d-%H%M%S')}.prof"
+                    if profiler.start_capture(PROFILE_CAPTURE_TICKS, path):
+                        print(f"Profiling the next {PROFILE_CAPTURE_TICKS} ticks to {path}")
+
+                if spectating:
+                    continue  # WATCHING ONLY
+
                 # Pause / resume (local)
                 if event.key == pygame.K_p and peer_connected:
-                    if game_state == STATE_RUNNING:
-                        game_state = STATE_PAUSED
+                    if game.phase == STATE_RUNNING:
+                        game.phase = STATE_PAUSED
                         paused_by = f"Player {local_player}"
                         send_control_message('pause')
-                    elif game_state == STATE_PAUSED:
+                    elif game.phase == STATE_PAUSED:
                         if paused_by == f"Player {local_player}":
-                            game_state = STATE_RUNNING
+                            game.phase = STATE_RUNNING
                             paused_by = None
                             send_control_message('resume')
 
                 # Reset: re-center snakes, scores, fruit, restart countdown
                 if event.key == pygame.K_r and peer_connected:
-                    reset_game_state()
-                    game_state = STATE_COUNTDOWN
+                    reset_game_state(new_round=True)
                     countdown_start_ms = pygame.time.get_ticks()
                     paused_by = None
                     send_control_message('reset')
 
                 # Movement only when actively RUNNINNG
-                if game_state == STATE_RUNNING:
-                    if local_player == 1:
-                        if event.key == pygame.K_w:
-                            snake1_change_to = 'UP'
-                        if event.key == pygame.K_s:
-                            snake1_change_to = 'DOWN'
-                        if event.key == pygame.K_a:
-                            snake1_change_to = 'LEFT'
-                        if event.key == pygame.K_d:
-                            snake1_change_to = 'RIGHT'
-                    
-                    elif local_player == 2:
-                        if event.key == pygame.K_UP:
-                            snake2_change_to = 'UP'
-                        elif event.key == pygame.K_DOWN:
-                            snake2_change_to = 'DOWN'
-                        elif event.key == pygame.K_LEFT:
-                            snake2_change_to = 'LEFT'
-                        elif event.key == pygame.K_RIGHT:
-                            snake2_change_to = 'RIGHT'
+                if game.phase == STATE_RUNNING:
+                    keys = P1_KEYS if local_player == 1 else P2_KEYS
+                    if event.key in keys:
+                        if lockstep:
+                            # APPLIED BY BOTH PEERS ON THE SAME TICK (see lockstep_step)
+                            lockstep_direction = keys[event.key]
+                        else:
+                            game.snake(local_player).change_to = keys[event.key]
+
+        # CONNECTS, PAUSES, RESETS AND LEAVES (STATES ARE ALSO PICKED UP EVERY TICK)
+        drain_inbound()
 
         # IF PEER ASKED TO GO BACK TO THE MAIN MENU
         if back_to_menu:
-            # CLOSE SOCKET
-            if client_socket:
-                client_socket.close()
-            if server_socket:
-                server_socket.close()
+            # CLOSE SOCKETS
+            close_connection()
 
             peer_connected = False
             back_to_menu = False
@@ -727,7 +2014,6 @@ def main():
             # RETURN TO MENU AND RESET GAME
             main_menu()
             reset_game_state()
-            game_state = STATE_COUNTDOWN
             countdown_start_ms = 0
             connection_initialized = False
             paused_by = None
@@ -736,176 +2022,85 @@ def main():
         # Only proceed with game logic if peer is connected
         if not peer_connected:
             draw_background(screen)
-            show_connection_status()
-            draw_controls()
+            show_connection_status(screen)
+            draw_controls(screen)
             pygame.display.update()
+            renderer.invalidate()
+            accumulator = 0.0
             fps.tick(10)
             continue
 
         # FIRST TIME WE DETECT CONNECTION: RESET AND RESTART COUNTDOWN ON BOTH SIDES
         if not connection_initialized:
+            start_state_sync()
             reset_game_state()
             countdown_start_ms = pygame.time.get_ticks()
             connection_initialized = True
 
         # countdown state
-        if game_state == STATE_COUNTDOWN:
+        if game.phase == STATE_COUNTDOWN:
             now = pygame.time.get_ticks()
             elapsed = (now - countdown_start_ms) / 1000.0
             if elapsed >= COUNTDOWN_SECONDS:
-                game_state = STATE_RUNNING
-
-        # Update remote snake state (always read network)
-        update_remote_snake()
-
-        # --- Local player controls & movement (only when RUNNING) ---
-        if game_state == STATE_RUNNING:
-            if local_player == 1:
-                # Prevents 180 degree turns
-                if snake1_change_to == 'UP' and snake1_direction != 'DOWN':
-                    snake1_direction = 'UP'
-                if snake1_change_to == 'DOWN' and snake1_direction != 'UP':
-                    snake1_direction = 'DOWN'
-                if snake1_change_to == 'LEFT' and snake1_direction != 'RIGHT':
-                    snake1_direction = 'LEFT'
-                if snake1_change_to == 'RIGHT' and snake1_direction != 'LEFT':
-                    snake1_direction = 'RIGHT'
-                
-                # Moving the snake
-                if snake1_direction == 'UP':
-                    snake1_pos[1] -= CELL
-                if snake1_direction == 'DOWN':
-                    snake1_pos[1] += CELL
-                if snake1_direction == 'LEFT':
-                    snake1_pos[0] -= CELL
-                if snake1_direction == 'RIGHT':
-                    snake1_pos[0] += CELL
-                
-                # Grow Snake / Eat fruit
-                snake1_body.insert(0, list(snake1_pos))
-                
-                if list(snake1_pos) == fruit_pos:
-                    snake1_score += 10
-                    fruit_spawn = False
-                else:
-                    snake1_body.pop()
-
-            elif local_player == 2:
-                # Prevents 180 degree turns
-                if snake2_change_to == 'UP' and snake2_direction != 'DOWN':
-                    snake2_direction = 'UP'
-                if snake2_change_to == 'DOWN' and snake2_direction != 'UP':
-                    snake2_direction = 'DOWN'
-                if snake2_change_to == 'LEFT' and snake2_direction != 'RIGHT':
-                    snake2_direction = 'LEFT'
-                if snake2_change_to == 'RIGHT' and snake2_direction != 'LEFT':
-                    snake2_direction = 'RIGHT'
-                
-                # Moving the snake
-                if snake2_direction == 'UP':
-                    snake2_pos[1] -= CELL
-                if snake2_direction == 'DOWN':
-                    snake2_pos[1] += CELL
-                if snake2_direction == 'LEFT':
-                    snake2_pos[0] -= CELL
-                if snake2_direction == 'RIGHT':
-                    snake2_pos[0] += CELL
-                
-                # Grow Snake / Eat fruit
-                snake2_body.insert(0, list(snake2_pos))
-                
-                if list(snake2_pos) == fruit_pos:
-                    snake2_score += 10
-                    fruit_spawn = False
-                else:
-                    snake2_body.pop()
-
-            # Host handles fruit spawning
-            if is_host and not fruit_spawn:
-                fruit_pos[:] = [
-                    random.randrange(1, (screen_width // CELL)) * CELL,
-                    random.randrange(1, (screen_height // CELL)) * CELL
-                ]
-                fruit_spawn = True
-
-        # Send local state to peer (during countdown + running so they see reset)
-        if game_state in (STATE_RUNNING, STATE_COUNTDOWN):
-            send_game_state()
+                game.phase = STATE_RUNNING
+        profiler.lap('events')
+
+        # Run as many fixed simulation steps as real time allows
+        while accumulator >= tick_ms:
+            game_tick()
+            accumulator -= tick_ms
+            report = profiler.tick()
+            if report:
+                print(report)
+        alpha = accumulator / tick_ms if INTERPOLATE else 1.0
+        update_camera(alpha)
 
         # --- Draw Everything ---
-        draw_background(screen)
-
-        # Title
-        title_shadow = FONT_TITLE.render("P2P Versus Snake", True, TEXT_SHADOW)
-        title_surf = FONT_TITLE.render("P2P Versus Snake", True, TEXT_COLOR)
-        screen.blit(title_shadow, (screen_width//2 - title_surf.get_width()//2 + 2, 18 + 2))
-        screen.blit(title_surf, (screen_width//2 - title_surf.get_width()//2, 18))
-
-        draw_snake(screen, snake1_body, P1_COLOR, P1_OUTLINE)
-        draw_snake(screen, snake2_body, P2_COLOR, P2_OUTLINE)
-        draw_fruit(screen, fruit_pos)
-
-        # Collisions only in RUNNING state
-        if game_state == STATE_RUNNING:
-            # Collision: Walls
-            for snake, pos, name in [
-                (snake1_body, snake1_pos, "Player 2"),
-                (snake2_body, snake2_pos, "Player 1")
-            ]:
-                if pos[0] < 0 or pos[0] > screen_width - CELL or pos[1] < 0 or pos[1] > screen_height - CELL:
-                    game_over(name)
-            
-            # Collision: Self
-            for block in snake1_body[1:]:
-                if snake1_pos[0] == block[0] and snake1_pos[1] == block[1]:
-                    game_over("Player 2")
-            for block in snake2_body[1:]:
-                if snake2_pos[0] == block[0] and snake2_pos[1] == block[1]:
-                    game_over("Player 1")
-
-            # Collision between snakes
-            for block in snake1_body:
-                if snake2_pos[0] == block[0] and snake2_pos[1] == block[1]:
-                    game_over("Player 1")
-            for block in snake2_body:
-                if snake1_pos[0] == block[0] and snake1_pos[1] == block[1]:
-                    game_over("Player 2")
-
-        # HUD
-        show_score()
-        show_connection_status()
-        draw_controls()
-
-        # Overlays for countdown / pause / game over
-        if game_state == STATE_COUNTDOWN:
-            now = pygame.time.get_ticks()
-            elapsed = (now - countdown_start_ms) / 1000.0
-            remaining = max(0.0, COUNTDOWN_SECONDS - elapsed)
-            if remaining > 0.5:
-                num = int(remaining) + 1
-                msg = str(num)
-            else:
-                msg = "GO!"
-            draw_center_text(screen, FONT_COUNTDOWN, msg, y_offset=-10)
-            draw_center_text(screen, FONT_SUB, "Round starting...", y_offset=40)
-
-        elif game_state == STATE_PAUSED:
-            draw_center_text(screen, FONT_COUNTDOWN, "PAUSED", y_offset=-10)
-            info = f"{paused_by} paused the game" if paused_by else "Game paused"
-            draw_center_text(screen, FONT_SUB, info, y_offset=40)
-            draw_center_text(screen, FONT_SUB, "Press P to resume or R to reset", y_offset=80)
-
-        elif game_state == STATE_GAME_OVER:
-            # SHOW WINNER AND OPTIONS
-            title = game_winner if game_winner else "Game Over"
-            draw_center_text(screen, FONT_COUNTDOWN, title, y_offset=-10)
-            draw_center_text(screen, FONT_SUB,
-                             "Press R for rematch or ESC for main menu",
-                             y_offset=40)
-
-        pygame.display.update()
-        fps.tick(snake_speed)
+        if DIRTY_RECTS and not INTERPOLATE:
+            # (interpolation moves every segment every frame, nothing to save)
+            renderer.render(screen)
+        else:
+            draw_scene(screen, alpha)
+            pygame.display.update()
+        profiler.lap('draw')
+        fps.tick(RENDER_FPS)
+        profiler.lap('wait')
+        profiler.end_frame()
+
+
+def watch_replay(path):
+    """Play a replay file back in real time (python3 snake_p2p_simple.py --replay FILE).
+
+    ESC stops; the snakes, HUD and overlays are drawn as in a live match.
+    """
+    global game, prev_bodies, renderer, countdown_start_ms, replaying
+    player = ReplayPlayer(path)
+    game = player.game
+    prev_bodies = [[] for _ in game.snakes]
+    renderer = DirtyRenderer()
+    replaying = True
+    tick_ms = 1000.0 / player.tick_rate
+    started_ms = pygame.time.get_ticks()
+    rounds = 0
+
+    for tick in player.ticks():
+        if player.rounds != rounds:
+            rounds = player.rounds
+            countdown_start_ms = pygame.time.get_ticks()
+        # DRAW UNTIL THIS TICK IS DUE (GAPS IN THE RECORDING ARE IDLE TICKS)
+        while pygame.time.get_ticks() - started_ms < tick * tick_ms:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                    return player.summary()
+            update_camera()
+            draw_scene(screen)
+            pygame.display.update()
+            fps.tick(RENDER_FPS)
+    return player.summary()
 
 
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) == 3 and sys.argv[1] == "--replay":
+        print(watch_replay(sys.argv[2]))
+    else:
+        main()
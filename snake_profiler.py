@@ -0,0 +1,143 @@
+# ==============================================================================
+# GROUP MEMBERS: Adrian R., Christian V., Kamy A. and Vanessa F.
+# ASGT: Project
+# ORGN: CMPS 3640
+# FILE: snake_profiler.py
+# DATE:
+# DESCRIPTION: Per-phase frame timing for the game loop. Each frame is split
+#              into named phases (events, remote snake, movement, collisions,
+#              sending, drawing, ...) with rolling p50 / p95 / max per phase,
+#              an optional per-frame CSV / JSONL log, and on-demand cProfile
+#              captures over a fixed number of ticks. No pygame dependency.
+# ==============================================================================
+
+# === Libraries ===
+import cProfile
+import io
+import json
+import pstats
+import time
+from collections import deque
+
+# PHASES IN THE ORDER THE LOOP RUNS THEM (LOG COLUMNS + OVERLAY ROWS)
+PHASES = ('events', 'remote', 'move', 'collide', 'send', 'record', 'misc', 'draw', 'wait')
+
+
+def percentile(ordered, q):
+    """Nearest-rank q-quantile (0..1) of an already sorted, non-empty list."""
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class FrameProfiler:
+    """Rolling per-phase timings for the frames of the main loop.
+
+    The loop calls begin_frame(), then lap(phase) right after each stage:
+    the time since the previous lap (or the frame start) is added to that
+    phase, so a stage that runs several times a frame (a logic tick behind)
+    is summed. end_frame() stores the frame's phase times in a window of
+    the last `window` frames; a phase that did not run that frame gets no
+    sample. A lap is one perf_counter() call, so it is cheap enough to stay
+    on all the time.
+    """
+
+    def __init__(self, window=300):
+        self.samples = {phase: deque(maxlen=window) for phase in ('frame',) + PHASES}
+        self.current = {}  # PHASE -> SECONDS SO FAR THIS FRAME
+        self.frame_start = self.mark = time.perf_counter()
+        self.frames = 0
+        self.cached_stats = None
+        self.cached_at = 0.0
+        self.log = None
+        self.log_jsonl = False
+        self.capture = None  # cProfile.Profile WHILE CAPTURING
+        self.capture_ticks = 0  # TICKS STILL TO CAPTURE
+        self.capture_path = None
+
+    # --- Timing ---
+    def begin_frame(self):
+        self.current = {}
+        self.frame_start = self.mark = time.perf_counter()
+
+    def lap(self, phase):
+        """Charge the time since the last lap to phase."""
+        now = time.perf_counter()
+        self.current[phase] = self.current.get(phase, 0.0) + now - self.mark
+        self.mark = now
+
+    def end_frame(self):
+        now = time.perf_counter()
+        self.frames += 1
+        self.samples['frame'].append((now - self.frame_start) * 1000.0)
+        for phase, seconds in self.current.items():
+            self.samples[phase].append(seconds * 1000.0)
+        if self.log:
+            self.write_log(now - self.frame_start)
+        self.current = {}
+        self.frame_start = self.mark = now
+
+    def stats(self, max_age=0.0):
+        """PHASE -> {'p50', 'p95', 'max'} in ms over the window, for phases with
+        samples. Recomputed at most every max_age seconds (for the overlay)."""
+        now = time.perf_counter()
+        if self.cached_stats is None or now - self.cached_at >= max_age:
+            stats = {}
+            for phase, samples in self.samples.items():
+                if samples:
+                    ordered = sorted(samples)
+                    stats[phase] = {'p50': percentile(ordered, 0.5), 'p95': percentile(ordered, 0.95),
+                                    'max': ordered[-1]}
+            self.cached_stats = stats
+            self.cached_at = now
+        return self.cached_stats
+
+    # --- Per-frame log ---
+    def open_log(self, path):
+        """Append one line per frame to path: JSON lines if it ends in .jsonl, else CSV."""
+        self.close_log()
+        self.log_jsonl = path.endswith('.jsonl')
+        self.log = open(path, 'a', buffering=1)  # LINE BUFFERED: A CRASH LOSES AT MOST ONE FRAME
+        if not self.log_jsonl and self.log.tell() == 0:
+            self.log.write(','.join(('frame', 'time', 'frame_ms') + PHASES) + '\n')
+
+    def write_log(self, frame_seconds):
+        phases = {phase: round(seconds * 1000.0, 3) for phase, seconds in self.current.items()}
+        if self.log_jsonl:
+            self.log.write(json.dumps({'frame': self.frames, 'time': round(time.time(), 3),
+                                       'frame_ms': round(frame_seconds * 1000.0, 3),
+                                       'phases': phases}) + '\n')
+        else:
+            row = [str(self.frames), f"{time.time():.3f}", f"{frame_seconds * 1000.0:.3f}"]
+            row.extend(str(phases[phase]) if phase in phases else '' for phase in PHASES)
+            self.log.write(','.join(row) + '\n')
+
+    def close_log(self):
+        if self.log:
+            self.log.close()
+            self.log = None
+
+    # --- cProfile capture ---
+    def start_capture(self, ticks, path):
+        """Profile everything on this thread for the next `ticks` logic ticks,
+        then save the stats to path (see tick()). False if one is running."""
+        if self.capture:
+            return False
+        self.capture = cProfile.Profile()
+        self.capture_ticks = ticks
+        self.capture_path = path
+        self.capture.enable()
+        return True
+
+    def tick(self):
+        """Count one logic tick; ends a running capture after its last one.
+        Returns a short report (the top functions) when a capture finished."""
+        if not self.capture:
+            return None
+        self.capture_ticks -= 1
+        if self.capture_ticks > 0:
+            return None
+        self.capture.disable()
+        self.capture.dump_stats(self.capture_path)
+        report = io.StringIO()
+        pstats.Stats(self.capture, stream=report).sort_stats('cumulative').print_stats(15)
+        self.capture = None
+        return report.getvalue()
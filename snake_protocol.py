@@ -0,0 +1,689 @@
+# ==============================================================================
+# GROUP MEMBERS: Adrian R., Christian V., Kamy A. and Vanessa F.
+# ASGT: Project
+# ORGN: CMPS 3640
+# FILE: snake_protocol.py
+# DATE:
+# DESCRIPTION: Peer-to-peer message helpers for the snake game. Per-tick
+#              snake state is sent as small deltas (new head, grew or not)
+#              with a full keyframe every few ticks or when asked for.
+#              Messages travel as length-prefixed binary frames (or JSON
+#              when debugging).
+# ==============================================================================
+
+# === Libraries ===
+import json
+import struct
+from collections import deque
+from itertools import chain
+
+from snake_engine import DIRECTIONS, MOVES, Occupancy, Snake
+
+KEYFRAME_INTERVAL = 50  # ticks between full snapshots of a snake
+
+PROTOCOL_VERSION = 8  # BUMP WHEN THE BINARY LAYOUT CHANGES; CHECKED AT CONNECT
+
+# Wire formats
+WIRE_BINARY = 'binary'
+WIRE_JSON = 'json'  # READABLE, FOR DEBUGGING; ANY PEER CAN DECODE EITHER
+
+# Message type codes (first payload byte)
+MSG_CONNECT = 1
+MSG_CONTROL = 2
+MSG_DELTA = 3
+MSG_KEYFRAME = 4
+MSG_PING = 5
+MSG_PONG = 6
+MSG_INPUT = 7
+MSG_WORLD = 8
+JSON_MARKER = ord('{')  # A PAYLOAD STARTING WITH '{' IS A JSON MESSAGE
+
+# Control messages carry no data besides who sent them
+CONTROL_TYPES = ('pause', 'resume', 'reset', 'quit_to_menu', 'keyframe_request')
+CONTROL_CODES = {name: code for code, name in enumerate(CONTROL_TYPES)}
+DIRECTION_CODES = {name: code for code, name in enumerate(DIRECTIONS)}
+NO_DIRECTION = 0xFF  # INPUT MESSAGE: NO KEY PRESSED THAT TICK
+
+# connect mode flag bits
+CONNECT_LOCKSTEP = 0x01
+CONNECT_SPECTATOR = 0x02  # PEER -> HOST: WATCH ONLY, NO PLAYER SLOT
+
+# game_state flag bits
+FLAG_MOVED = 0x01
+FLAG_GROW = 0x02
+FLAG_FRUIT = 0x04
+FLAG_ATE = 0x08  # FOLLOWED BY THE EATEN FRUIT'S CELL
+
+FRAME_HEADER = struct.Struct('!I')              # payload length
+CONNECT = struct.Struct('!BHBHBIHBHH')          # type, version, player_id, udp_port (0 = none), mode flags, seed,
+                                                # players (bit per player in the match), slot (your player number),
+                                                # arena columns, arena rows
+CONTROL = struct.Struct('!BBB')                 # type, control code, by (0 = nobody)
+STATE = struct.Struct('!BBIBBI')                # type, player, seq, flags, direction, score
+POINT = struct.Struct('!hh')                    # cell column, cell row
+COUNT = struct.Struct('!I')                     # keyframe body length
+PING = struct.Struct('!BId')                    # type, id, t0 (sender clock, s)
+PONG = struct.Struct('!BIddd')                  # type, id, t0 echoed, t1 received, t2 replied
+INPUT = struct.Struct('!BBBIB')                 # type, player, round, tick, direction
+WORLD = struct.Struct('!BIH')                   # type, tick, state count; then the state frames
+
+
+class DeltaEncoder:
+    """Turns one local snake into a stream of game_state messages.
+
+    Each message carries a sequence number. Normally it only holds the new
+    head (or None if the snake did not move) and whether the snake grew, so
+    its size does not depend on snake length. A keyframe with the whole
+    body goes out every `keyframe_interval` messages, after
+    request_keyframe() (reset, peer asked for one) and whenever the change
+    since the last message is not a single step.
+    """
+
+    def __init__(self, player, keyframe_interval=KEYFRAME_INTERVAL):
+        self.player = player
+        self.keyframe_interval = keyframe_interval
+        self.seq = 0
+        self.since_keyframe = 0
+        self.need_keyframe = True
+        self.last_head = None
+        self.last_len = 0
+
+    def request_keyframe(self):
+        self.need_keyframe = True
+
+    def encode(self, snake):
+        self.seq += 1
+        head = snake.pos
+        length = len(snake.body)
+
+        msg = {'type': 'game_state', 'player': self.player, 'seq': self.seq,
+               'direction': snake.direction, 'score': snake.score}
+
+        moved = head != self.last_head
+        if moved:
+            # ONE STEP: OLD HEAD IS NOW THE NECK, LENGTH SAME OR +1
+            delta_ok = (length > 1 and snake.body[1] == self.last_head
+                        and length - self.last_len in (0, 1))
+        else:
+            delta_ok = length == self.last_len
+
+        if self.need_keyframe or not delta_ok or self.since_keyframe >= self.keyframe_interval:
+            msg['key'] = True
+            msg['body'] = list(snake.body)
+            self.need_keyframe = False
+            self.since_keyframe = 0
+        else:
+            msg['head'] = head if moved else None
+            msg['grow'] = length > self.last_len
+            self.since_keyframe += 1
+
+        self.last_head = head
+        self.last_len = length
+        return msg
+
+
+def keyframe(player, seq, snake, fruit_pos=None):
+    """A keyframe game_state message for snake as of message number seq (e.g.
+    to bring a new or lagging viewer up to date mid-stream)."""
+    msg = {'type': 'game_state', 'player': player, 'seq': seq, 'key': True,
+           'body': list(snake.body), 'direction': snake.direction, 'score': snake.score}
+    if fruit_pos is not None:
+        msg['fruit_pos'] = fruit_pos
+    return msg
+
+
+class DeltaDecoder:
+    """Applies one remote player's game_state messages to a local Snake copy.
+
+    Deltas are only applied on top of the message right before them; after
+    a gap (lost / dropped message) everything is ignored until the next
+    keyframe, and apply() returns False so the caller can ask for one.
+    Messages at or before the last applied one (duplicates, late arrivals)
+    are dropped.
+    """
+
+    def __init__(self):
+        self.seq = None  # LAST APPLIED SEQUENCE NUMBER (None = NEED A KEYFRAME)
+        self.waiting_since = None  # SEQ AT WHICH WE LAST ASKED FOR A KEYFRAME
+
+    def apply(self, msg, snake):
+        """Apply msg to snake. Returns False if a keyframe should be requested."""
+        seq = msg['seq']
+        if self.seq is not None and seq <= self.seq:
+            return True  # STALE / DUPLICATE COPY
+
+        if msg.get('key'):
+            snake.set_state(msg['body'], msg['direction'], msg['score'])
+            self.seq = seq
+            self.waiting_since = None
+            return True
+
+        if self.seq is None or seq != self.seq + 1:
+            self.seq = None
+            # ASK ONCE, THEN AGAIN ONLY IF THE KEYFRAME NEVER SHOWS UP
+            if self.waiting_since is None or seq - self.waiting_since > KEYFRAME_INTERVAL:
+                self.waiting_since = seq
+                return False
+            return True
+
+        head = msg['head']
+        if head is not None:
+            snake.push_head((head[0], head[1]))
+            if not msg['grow']:
+                snake.pop_tail()
+        snake.direction = msg['direction']
+        snake.score = msg['score']
+        self.seq = seq
+        return True
+
+
+class RemotePredictor:
+    """Dead-reckons one remote snake between authoritative updates.
+
+    Messages are applied (through a DeltaDecoder) to a private copy of the
+    snake, the last state the peer actually reported. Each tick, advance()
+    brings the shown snake in the GameState up to that copy and moves it
+    `lead` cells further along its last known direction without growing, so
+    it sits where the peer most likely is by now instead of one trip behind.
+    This is incremental: the predicted cells are taken back, the new deltas
+    replayed and the prediction redone, so a tick costs O(lead + deltas)
+    however long the snake is; only keyframes and resets copy the body.
+    Extrapolation stops at walls and occupied cells, so a guess never kills
+    the snake or eats into another one. The lead drops by at most one cell a
+    tick, so catching up with a late update happens gradually.
+    """
+
+    def __init__(self, game, player, max_lead=3):
+        self.game = game
+        self.player = player
+        self.max_lead = max_lead
+        self.decoder = DeltaDecoder()
+        self.auth = Snake(player, Occupancy(game.width, game.height, game.cell))
+        self.auth.set_body(game.snake(player).body)
+        self.fresh = False  # NEW AUTHORITATIVE STATE SINCE THE LAST advance()
+        self.deltas = []  # (HEAD, GROW) APPLIED TO auth SINCE THE LAST advance()
+        self.resync = True  # COPY THE WHOLE BODY NEXT advance() (KEYFRAME / RESET)
+        self.shown = None  # THE SHOWN SNAKE'S BODY AS advance() LEFT IT
+        self.tails = []  # TAIL CELLS THE PREDICTION POPPED, OLDEST FIRST
+        self.keyframed = False  # ... AND IT INCLUDED A KEYFRAME (A JUMP, NOT A MISPREDICTION)
+        self.stale_ticks = 0  # TICKS SINCE THE LAST AUTHORITATIVE UPDATE
+        self.lead = 0
+        self.updates = 0
+        self.corrections = 0
+        self.error_total = 0
+        self.error_max = 0
+
+    def reset(self):
+        """Match restarted locally: trust the GameState's snake until the peer reports."""
+        snake = self.game.snake(self.player)
+        self.auth.set_state(snake.body, snake.direction, snake.score)
+        self.resync = True
+        self.stale_ticks = 0
+        self.lead = 0
+
+    def apply(self, msg):
+        """Apply one game_state message. Returns False if a keyframe should be requested."""
+        seq = self.decoder.seq
+        ok = self.decoder.apply(msg, self.auth)
+        if self.decoder.seq is not None and self.decoder.seq != seq:
+            self.fresh = True
+            if msg.get('key'):
+                self.keyframed = True
+                self.resync = True
+            elif msg['head'] is not None:
+                self.deltas.append((msg['head'], msg['grow']))
+        return ok
+
+    def advance(self, base_lead=1, predict=True):
+        """Bring the shown snake up to the authoritative copy plus a prediction.
+
+        base_lead is how many ticks the peer is likely ahead of its newest
+        message (one tick plus the one-way trip); ticks without any update
+        add to it. With predict=False the snake is shown exactly as reported.
+        """
+        snake = self.game.snake(self.player)
+        auth = self.auth
+        if self.fresh or not predict:
+            self.stale_ticks = 0
+        else:
+            self.stale_ticks += 1
+
+        cell = self.game.cell
+        expected = None  # WHERE THE HEAD WOULD BE NOW WITHOUT THE NEW UPDATE
+        if predict and snake.alive:
+            target = min(self.max_lead, base_lead + self.stale_ticks)
+            lead = max(target, self.lead - 1)
+            if snake.body:
+                dx, dy = MOVES[snake.direction]
+                expected = (snake.pos[0] + dx * cell, snake.pos[1] + dy * cell)
+        else:
+            lead = 0
+
+        if self.resync or snake.body is not self.shown:
+            # KEYFRAME, RESET OR THE BODY WAS REPLACED UNDER US: START FROM THE COPY
+            snake.set_body(auth.body)
+            self.resync = False
+        else:
+            # TAKE BACK LAST TICK'S GUESS, THEN CATCH UP WITH WHAT WAS REPORTED
+            for tail in reversed(self.tails):
+                snake.pop_head()
+                snake.push_tail(tail)
+            for head, grow in self.deltas:
+                snake.push_head((head[0], head[1]))
+                if not grow:
+                    snake.pop_tail()
+        self.deltas.clear()
+        self.tails.clear()
+        self.shown = snake.body
+        snake.direction = auth.direction
+        snake.change_to = auth.direction
+        snake.score = auth.score
+        dx, dy = MOVES[auth.direction]
+        moved = 0
+        while moved < lead:
+            x, y = snake.pos
+            head = (x + dx * cell, y + dy * cell)
+            if not self.game.in_bounds(head) or self.game.grid.count(head):
+                break
+            snake.push_head(head)
+            self.tails.append(snake.pop_tail())
+            moved += 1
+        self.lead = moved
+
+        if self.fresh:
+            self.fresh = False
+            self.updates += 1
+            if self.keyframed:
+                self.keyframed = False
+            elif expected is not None and expected != snake.pos:
+                error = (abs(expected[0] - snake.pos[0]) + abs(expected[1] - snake.pos[1])) // cell
+                self.corrections += 1
+                self.error_total += error
+                self.error_max = max(self.error_max, error)
+
+    def stats(self):
+        """Prediction quality: how often and how far (in cells) updates moved the snake."""
+        return {
+            'updates': self.updates,
+            'corrections': self.corrections,
+            'correction_rate': self.corrections / self.updates if self.updates else 0.0,
+            'mean_error_cells': self.error_total / self.corrections if self.corrections else 0.0,
+            'max_error_cells': self.error_max,
+            'lead_ticks': self.lead,
+        }
+
+
+class LockstepInputs:
+    """Per-tick direction inputs for a lockstep match.
+
+    In lockstep both peers run the whole simulation and only exchange what
+    each player pressed. An input made on tick T is scheduled for tick
+    T + delay, which gives it `delay` ticks to reach the peer; ticks before
+    `delay` have no input. A tick may only be simulated once every player's
+    input for it is here (ready()). Inputs carry the round (bumped on every
+    reset, modulo 256) so late inputs from the previous round are dropped.
+    """
+
+    def __init__(self, players, delay=2):
+        self.players = tuple(players)
+        self.delay = delay
+        self.round = 0
+        self.inputs = {}  # TICK -> {PLAYER: DIRECTION OR None}
+
+    def new_round(self):
+        self.round = (self.round + 1) % 256
+        self.inputs.clear()
+
+    def add(self, msg):
+        """Store one input message; returns False if it belongs to another round."""
+        if msg['round'] != self.round:
+            return False
+        self.inputs.setdefault(msg['tick'], {})[msg['player']] = msg['direction']
+        return True
+
+    def message(self, player, tick, direction):
+        """The input message for our direction on the tick `delay` ticks after `tick`."""
+        return {'type': 'input', 'player': player, 'round': self.round,
+                'tick': tick + self.delay, 'direction': direction}
+
+    def ready(self, tick):
+        if tick < self.delay:
+            return True
+        have = self.inputs.get(tick, ())
+        return all(player in have for player in self.players)
+
+    def take(self, tick):
+        """Remove and return tick's inputs as GameState.step() wants them (no Nones)."""
+        have = self.inputs.pop(tick, {})
+        return {player: direction for player, direction in have.items() if direction is not None}
+
+
+class WireCodec:
+    """Converts message dicts to framed bytes and back.
+
+    Messages stay plain dicts in pixel coordinates everywhere else; on the
+    wire, positions become signed 16-bit cell indices and direction / control
+    names become one-byte enums. Each frame is a 4-byte big-endian length
+    followed by the payload. With wire_format=WIRE_JSON the payload is the
+    JSON text instead; decode() accepts both, so the two formats can talk.
+    """
+
+    def __init__(self, cell, wire_format=WIRE_BINARY):
+        self.cell = cell
+        self.wire_format = wire_format
+
+    # --- Encoding ---
+    def encode(self, msg):
+        """Return the complete frame (length prefix + payload) for msg."""
+        payload = None
+        if self.wire_format == WIRE_BINARY:
+            payload = self.encode_binary(msg)
+        if payload is None:
+            payload = json.dumps(msg).encode('utf-8')
+        return self.frame(payload)
+
+    def encode_binary(self, msg):
+        """Binary payload for msg, or None if this type has no binary layout."""
+        msg_type = msg.get('type')
+        if msg_type == 'connect':
+            return CONNECT.pack(MSG_CONNECT, msg['version'], msg['player_id'], msg.get('udp_port') or 0,
+                                (CONNECT_LOCKSTEP if msg.get('lockstep') else 0)
+                                | (CONNECT_SPECTATOR if msg.get('spectator') else 0),
+                                msg.get('seed') or 0,
+                                sum(1 << (player - 1) for player in msg.get('players') or ()),
+                                msg.get('slot') or 0, msg.get('cols') or 0, msg.get('rows') or 0)
+        if msg_type in CONTROL_CODES:
+            return CONTROL.pack(MSG_CONTROL, CONTROL_CODES[msg_type], msg.get('by') or 0)
+        if msg_type == 'game_state':
+            return self.encode_state(msg)
+        if msg_type == 'ping':
+            return PING.pack(MSG_PING, msg['id'], msg['t0'])
+        if msg_type == 'pong':
+            return PONG.pack(MSG_PONG, msg['id'], msg['t0'], msg['t1'], msg['t2'])
+        if msg_type == 'input':
+            direction = msg['direction']
+            return INPUT.pack(MSG_INPUT, msg['player'], msg['round'], msg['tick'],
+                              NO_DIRECTION if direction is None else DIRECTION_CODES[direction])
+        return None
+
+    @staticmethod
+    def frame(payload):
+        """Complete frame for an already encoded payload (e.g. one being relayed)."""
+        return FRAME_HEADER.pack(len(payload)) + bytes(payload)
+
+    def encode_world(self, tick, frames):
+        """One frame carrying every player's state for a tick, built from their
+        already encoded game_state frames (so relaying never re-encodes them)."""
+        if self.wire_format != WIRE_BINARY:
+            states = [self.decode(payload) for payload in split_frames(b''.join(frames))]
+            return self.encode({'type': 'world', 'tick': tick, 'states': states})
+        header = WORLD.pack(MSG_WORLD, tick, len(frames))
+        length = len(header) + sum(len(frame) for frame in frames)
+        return b''.join([FRAME_HEADER.pack(length), header, *frames])
+
+    def encode_state(self, msg):
+        cell = self.cell
+        flags = 0
+        parts = []
+        fruit = msg.get('fruit_pos')
+        if fruit:
+            flags |= FLAG_FRUIT
+        ate = msg.get('ate_fruit')
+        if ate:
+            flags |= FLAG_ATE
+
+        if msg.get('key'):
+            msg_code = MSG_KEYFRAME
+            body = msg['body']
+            parts.append(COUNT.pack(len(body)))
+            if fruit:
+                parts.append(POINT.pack(fruit[0] // cell, fruit[1] // cell))
+            if ate:
+                parts.append(POINT.pack(ate[0] // cell, ate[1] // cell))
+            parts.append(struct.pack(f'!{2 * len(body)}h',
+                                     *chain.from_iterable((x // cell, y // cell) for x, y in body)))
+        else:
+            msg_code = MSG_DELTA
+            head = msg['head']
+            if head is not None:
+                flags |= FLAG_MOVED
+                parts.append(POINT.pack(head[0] // cell, head[1] // cell))
+            if msg['grow']:
+                flags |= FLAG_GROW
+            if fruit:
+                parts.append(POINT.pack(fruit[0] // cell, fruit[1] // cell))
+            if ate:
+                parts.append(POINT.pack(ate[0] // cell, ate[1] // cell))
+
+        header = STATE.pack(msg_code, msg['player'], msg['seq'], flags,
+                            DIRECTION_CODES[msg['direction']], msg['score'])
+        return header + b''.join(parts)
+
+    # --- Decoding ---
+    def decode(self, payload):
+        """Message dict for one frame payload (bytes-like)."""
+        msg_code = payload[0]
+        if msg_code == JSON_MARKER:
+            return json.loads(bytes(payload).decode('utf-8'))
+        if msg_code == MSG_CONNECT:
+            if len(payload) < CONNECT.size:
+                # OLDER PEER: REPORT ITS VERSION SO THE HANDSHAKE CAN REJECT IT
+                _, version = struct.unpack_from('!BH', payload)
+                return {'type': 'connect', 'version': version, 'player_id': None}
+            _, version, player_id, udp_port, mode, seed, players, slot, cols, rows = CONNECT.unpack_from(payload)
+            return {'type': 'connect', 'version': version, 'player_id': player_id,
+                    'udp_port': udp_port, 'lockstep': bool(mode & CONNECT_LOCKSTEP),
+                    'spectator': bool(mode & CONNECT_SPECTATOR), 'seed': seed,
+                    'players': [bit + 1 for bit in range(16) if players >> bit & 1] or None,
+                    'slot': slot or None, 'cols': cols, 'rows': rows}
+        if msg_code == MSG_CONTROL:
+            _, code, by = CONTROL.unpack_from(payload)
+            return {'type': CONTROL_TYPES[code], 'by': by or None}
+        if msg_code in (MSG_DELTA, MSG_KEYFRAME):
+            return self.decode_state(payload)
+        if msg_code == MSG_PING:
+            _, ping_id, t0 = PING.unpack_from(payload)
+            return {'type': 'ping', 'id': ping_id, 't0': t0}
+        if msg_code == MSG_PONG:
+            _, ping_id, t0, t1, t2 = PONG.unpack_from(payload)
+            return {'type': 'pong', 'id': ping_id, 't0': t0, 't1': t1, 't2': t2}
+        if msg_code == MSG_INPUT:
+            _, player, round_, tick, direction = INPUT.unpack_from(payload)
+            return {'type': 'input', 'player': player, 'round': round_, 'tick': tick,
+                    'direction': None if direction == NO_DIRECTION else DIRECTIONS[direction]}
+        if msg_code == MSG_WORLD:
+            _, tick, _ = WORLD.unpack_from(payload)
+            states = [self.decode(state) for state in split_frames(payload[WORLD.size:])]
+            return {'type': 'world', 'tick': tick, 'states': states}
+        raise ValueError(f"unknown message type {msg_code}")
+
+    def decode_state(self, payload):
+        cell = self.cell
+        msg_code, player, seq, flags, direction, score = STATE.unpack_from(payload)
+        offset = STATE.size
+        msg = {'type': 'game_state', 'player': player, 'seq': seq,
+               'direction': DIRECTIONS[direction], 'score': score}
+
+        if msg_code == MSG_KEYFRAME:
+            msg['key'] = True
+            (count,) = COUNT.unpack_from(payload, offset)
+            offset += COUNT.size
+        elif flags & FLAG_MOVED:
+            cx, cy = POINT.unpack_from(payload, offset)
+            offset += POINT.size
+            msg['head'] = (cx * cell, cy * cell)
+        else:
+            msg['head'] = None
+
+        if flags & FLAG_FRUIT:
+            cx, cy = POINT.unpack_from(payload, offset)
+            offset += POINT.size
+            msg['fruit_pos'] = (cx * cell, cy * cell)
+        msg['ate_fruit'] = None
+        if flags & FLAG_ATE:
+            cx, cy = POINT.unpack_from(payload, offset)
+            offset += POINT.size
+            msg['ate_fruit'] = (cx * cell, cy * cell)
+
+        if msg_code == MSG_KEYFRAME:
+            coords = struct.unpack_from(f'!{2 * count}h', payload, offset)
+            it = iter(coords)
+            msg['body'] = [(cx * cell, cy * cell) for cx, cy in zip(it, it)]
+        else:
+            msg['grow'] = bool(flags & FLAG_GROW)
+        return msg
+
+
+class LatencyEstimator:
+    """Round-trip time, jitter and clock offset from ping / pong timestamps.
+
+    Uses the NTP four-timestamp exchange: t0 ping sent (our clock), t1 ping
+    received and t2 pong sent (peer clock), t3 pong received (our clock).
+    RTT excludes the peer's turnaround time. Smoothed RTT and jitter follow
+    RFC 6298 / RFC 3550 style running averages. The clock offset (peer clock
+    minus ours) is taken from the lowest-RTT sample in the window, the one
+    least distorted by queueing.
+    """
+
+    def __init__(self, window=32):
+        self.samples = deque(maxlen=window)  # (rtt, offset), SECONDS
+        self.srtt = None
+        self.jitter = 0.0
+        self.last_rtt = None
+
+    def add_sample(self, t0, t1, t2, t3):
+        rtt = max(0.0, (t3 - t0) - (t2 - t1))
+        offset = ((t1 - t0) + (t2 - t3)) / 2
+        self.samples.append((rtt, offset))
+
+        if self.srtt is None:
+            self.srtt = rtt
+        else:
+            self.srtt += (rtt - self.srtt) / 8
+        if self.last_rtt is not None:
+            self.jitter += (abs(rtt - self.last_rtt) - self.jitter) / 16
+        self.last_rtt = rtt
+
+    def stats(self):
+        """Current estimates in milliseconds, or None before the first pong."""
+        if not self.samples:
+            return None
+        min_rtt, offset = min(self.samples)
+        return {
+            'rtt_ms': self.srtt * 1000.0,
+            'last_rtt_ms': self.last_rtt * 1000.0,
+            'min_rtt_ms': min_rtt * 1000.0,
+            'jitter_ms': self.jitter * 1000.0,
+            'clock_offset_ms': offset * 1000.0,
+            'samples': len(self.samples),
+        }
+
+
+class RedundantSender:
+    """Packs the last few state frames into each datagram for unreliable links.
+
+    Every datagram carries the newest frame plus up to `copies - 1` earlier
+    ones (as long as they fit in max_size), so a single lost packet costs
+    nothing: the next one repeats what it held. The receiver drops copies
+    it has already applied.
+    """
+
+    def __init__(self, copies=3, max_size=1200):
+        self.copies = copies
+        self.max_size = max_size
+        self.recent = []
+
+    def datagram(self, frame):
+        """Remember frame and return the datagram to send for it."""
+        self.recent.append(frame)
+        del self.recent[:-self.copies]
+        size = len(frame)
+        first = len(self.recent) - 1
+        while first > 0 and size + len(self.recent[first - 1]) <= self.max_size:
+            first -= 1
+            size += len(self.recent[first])
+        return b''.join(self.recent[first:])
+
+
+MAX_FRAME = 16 * 1024 * 1024  # LARGER LENGTH PREFIX = CORRUPT STREAM
+
+
+def split_frames(data):
+    """Yield the payloads of frames packed back-to-back in one complete buffer
+    (e.g. a datagram), as memoryview slices of it."""
+    view = memoryview(data)
+    offset = 0
+    while offset + FRAME_HEADER.size <= len(view):
+        (length,) = FRAME_HEADER.unpack_from(view, offset)
+        offset += FRAME_HEADER.size
+        if offset + length > len(view):
+            raise ValueError("truncated frame")
+        yield view[offset:offset + length]
+        offset += length
+
+
+class FrameReader:
+    """Reads length-prefixed frames from a byte stream without re-copying them.
+
+    The transport writes straight into one preallocated bytearray through
+    get_buffer() / received() (asyncio.BufferedProtocol) and frames() hands
+    out memoryview slices of it, only advancing a read offset. A partial
+    frame left at the end is moved to the front at most once per read, and
+    the buffer is only replaced by a bigger one for a frame that does not
+    fit. Payload views are only valid until the next get_buffer() call, so
+    decode them right away.
+    """
+
+    def __init__(self, size=65536):
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.start = 0  # FIRST BYTE NOT YET HANDED OUT
+        self.end = 0    # END OF RECEIVED DATA
+
+    def make_room(self, needed):
+        """Make sure `needed` more bytes fit after the unread data."""
+        unread = self.end - self.start
+        if self.start and self.end + needed > len(self.buffer):
+            # SHIFT THE PARTIAL FRAME TO THE FRONT (SAME-SIZE SLICE ASSIGNMENT, NO RESIZE)
+            self.buffer[:unread] = self.view[self.start:self.end]
+            self.start, self.end = 0, unread
+        if self.end + needed > len(self.buffer):
+            # NEW BUFFER RATHER THAN RESIZING: OLD PAYLOAD VIEWS MAY STILL EXIST
+            bigger = bytearray(max(len(self.buffer) * 2, unread + needed))
+            bigger[:unread] = self.view[self.start:self.end]
+            self.buffer, self.view = bigger, memoryview(bigger)
+            self.start, self.end = 0, unread
+
+    def get_buffer(self, chunk=4096):
+        """Writable view of the free space after the received data (at least
+        chunk bytes), e.g. for asyncio.BufferedProtocol; report how much was
+        written into it with received()."""
+        self.make_room(chunk)
+        return self.view[self.end:]
+
+    def received(self, count):
+        self.end += count
+
+    def feed(self, data):
+        """Append bytes received some other way; returns copies of the complete payloads."""
+        self.make_room(len(data))
+        self.buffer[self.end:self.end + len(data)] = data
+        self.end += len(data)
+        return [bytes(payload) for payload in self.frames()]
+
+    def frames(self):
+        """Yield the payload of every complete frame received so far."""
+        view = self.view
+        while self.end - self.start >= FRAME_HEADER.size:
+            (length,) = FRAME_HEADER.unpack_from(view, self.start)
+            if length > MAX_FRAME:
+                raise ValueError(f"frame length {length} too large")
+            begin = self.start + FRAME_HEADER.size
+            if begin + length > self.end:
+                # PARTIAL FRAME: MAKE SURE THE REST WILL FIT, THEN WAIT FOR IT
+                self.make_room(begin + length - self.end)
+                return
+            self.start = begin + length
+            yield view[begin:self.start]
+        if self.start == self.end:
+            self.start = self.end = 0
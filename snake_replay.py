@@ -0,0 +1,222 @@
+# ==============================================================================
+# GROUP MEMBERS: Adrian R., Christian V., Kamy A. and Vanessa F.
+# ASGT: Project
+# ORGN: CMPS 3640
+# FILE: snake_replay.py
+# DATE:
+# DESCRIPTION: Match recording and playback. A replay is a gzip-compressed
+#              stream of the same binary frames the peers exchange: every
+#              snake's per-tick delta (keyframes after a reset or a jump),
+#              the fruit, and pause / resume / leave events. Playback runs
+#              on a headless GameState and re-checks every collision.
+#
+#              python3 snake_replay.py FILE...   (re-run at full speed)
+# ==============================================================================
+
+# === Libraries ===
+import gzip
+import json
+import sys
+import time
+
+from snake_engine import (GameState, STATE_COUNTDOWN, STATE_RUNNING,
+                          STATE_PAUSED, STATE_GAME_OVER)
+from snake_protocol import DeltaEncoder, DeltaDecoder, WireCodec, split_frames
+
+REPLAY_VERSION = 1  # BUMP WHEN THE RECORD LAYOUT CHANGES
+
+# PHASE -> CONTROL MESSAGE THAT PUTS A REPLAY INTO IT (GAME OVER IS RE-DERIVED)
+PHASE_CONTROLS = {STATE_COUNTDOWN: 'reset', STATE_RUNNING: 'resume', STATE_PAUSED: 'pause'}
+CONTROL_PHASES = {name: phase for phase, name in PHASE_CONTROLS.items()}
+
+
+class ReplayRecorder:
+    """Writes one session (any number of rounds) to a replay file.
+
+    Call new_round() after every reset and record() once per logic tick,
+    after the simulation step. Records, in order:
+
+    - a 'replay' header (board size, snake count, tick rate, who recorded it)
+    - per round: a 'round' record (RNG seed, players) and a world frame with
+      every snake as a keyframe plus the fruit (the state right after reset)
+    - per tick: phase changes and players leaving as control frames, then
+      one world frame (tick number + every snake that changed, as deltas)
+    - a 'result' record when a round ends, to check playback against
+
+    Snakes are recorded as they ended up on this machine rather than as key
+    presses, since outside lockstep the other snakes are whatever the
+    network delivered. Ticks where nothing changed cost nothing.
+    """
+
+    def __init__(self, path, game, tick_rate, local_player=None, lockstep=False):
+        self.file = gzip.open(path, 'xb')
+        self.path = path
+        self.codec = WireCodec(game.cell)
+        self.encoders = {}  # PLAYER -> DeltaEncoder
+        self.last = {}  # PLAYER -> (head, length, direction, score) LAST RECORDED
+        self.fruit = None
+        self.phase = None
+        self.active = set(game.active)
+        self.tick = 0
+        self.round_seed = None  # SET BY new_round() UNTIL THE NEXT record()
+        self.write({'type': 'replay', 'version': REPLAY_VERSION, 'width': game.width,
+                    'height': game.height, 'cell': game.cell, 'snakes': len(game.snakes),
+                    'tick_rate': tick_rate, 'local_player': local_player,
+                    'lockstep': lockstep, 'created': time.time()})
+
+    def write(self, msg):
+        self.file.write(self.codec.encode(msg))
+
+    def new_round(self, seed=0):
+        """The match was just reset; the next record() starts a new round."""
+        self.round_seed = seed
+
+    def record(self, game):
+        """Append this tick's changes."""
+        self.tick += 1
+        if self.round_seed is not None:
+            self.write({'type': 'round', 'seed': self.round_seed, 'players': sorted(game.active)})
+            self.round_seed = None
+            self.phase = STATE_COUNTDOWN
+            self.active = set(game.active)
+            self.last.clear()
+            self.fruit = None
+            for encoder in self.encoders.values():
+                encoder.request_keyframe()
+
+        for player in sorted(self.active - game.active):
+            self.write({'type': 'quit_to_menu', 'by': player})
+        self.active = set(game.active)
+
+        phase = game.phase
+        if phase != self.phase and phase in PHASE_CONTROLS:
+            self.write({'type': PHASE_CONTROLS[phase]})
+        elif phase == STATE_GAME_OVER and self.phase not in (STATE_RUNNING, STATE_GAME_OVER):
+            # LEFT A PAUSE / COUNTDOWN AND ENDED ON THE SAME TICK: PLAYBACK MUST
+            # RUN THIS TICK TO FIND THE GAME OVER ITSELF
+            self.write({'type': PHASE_CONTROLS[STATE_RUNNING]})
+
+        states = []
+        for snake in game.snakes:
+            if not snake.body:
+                continue
+            key = (snake.pos, len(snake.body), snake.direction, snake.score)
+            if self.last.get(snake.player) != key:
+                self.last[snake.player] = key
+                states.append(self.encode(snake))
+        if game.fruit_pos != self.fruit:
+            if not states:
+                # NOTHING MOVED, SO THE FRUIT RIDES ON AN UNCHANGED SNAKE
+                carrier = next((snake for snake in game.snakes if snake.body), None)
+                if carrier:
+                    states.append(self.encode(carrier))
+            if states:
+                states[0]['fruit_pos'] = game.fruit_pos
+                self.fruit = game.fruit_pos
+        if states:
+            self.file.write(self.codec.encode_world(
+                self.tick, [self.codec.encode(state) for state in states]))
+
+        if phase == STATE_GAME_OVER and self.phase != STATE_GAME_OVER:
+            self.write({'type': 'result', 'winner': game.winner,
+                        'scores': [snake.score for snake in game.snakes]})
+        self.phase = phase
+
+    def encode(self, snake):
+        encoder = self.encoders.get(snake.player)
+        if encoder is None:
+            encoder = self.encoders[snake.player] = DeltaEncoder(snake.player)
+        return encoder.encode(snake)
+
+    def close(self):
+        self.file.close()
+
+
+class ReplayPlayer:
+    """Re-runs a replay file on a headless GameState (see ReplayRecorder).
+
+    Each world frame is applied to the snakes, then the collision rules run
+    again, so who died and who won is decided here, not read back; a round
+    whose outcome differs from the recorded one is listed in mismatches.
+    ticks() yields after every world frame so a viewer can pace and draw;
+    run() goes through the whole file as fast as possible.
+    """
+
+    def __init__(self, path):
+        with gzip.open(path, 'rb') as f:
+            self.data = f.read()
+        self.frames = split_frames(self.data)
+        first = next(self.frames, b'')
+        self.header = json.loads(bytes(first).decode('utf-8')) if first[:1] == b'{' else {}
+        if self.header.get('type') != 'replay' or self.header.get('version') != REPLAY_VERSION:
+            raise ValueError(f"{path} is not a version {REPLAY_VERSION} replay")
+        self.codec = WireCodec(self.header['cell'])
+        self.game = GameState(self.header['width'], self.header['height'],
+                              self.header['cell'], self.header['snakes'])
+        self.tick_rate = self.header['tick_rate']
+        self.decoders = {}  # PLAYER -> DeltaDecoder
+        self.tick = 0  # RECORDED TICK OF THE LAST APPLIED WORLD FRAME
+        self.rounds = 0
+        self.results = []
+        self.mismatches = []
+
+    def ticks(self):
+        """Apply the replay record by record, yielding the tick number after each world frame."""
+        game = self.game
+        for payload in self.frames:
+            msg = self.codec.decode(payload)
+            msg_type = msg.get('type')
+            if msg_type == 'world':
+                for state in msg['states']:
+                    player = state['player']
+                    decoder = self.decoders.get(player)
+                    if decoder is None:
+                        decoder = self.decoders[player] = DeltaDecoder()
+                    decoder.apply(state, game.snake(player))
+                    if state.get('fruit_pos'):
+                        game.fruit_pos = tuple(state['fruit_pos'])
+                game.check_collisions()
+                self.tick = msg['tick']
+                yield self.tick
+            elif msg_type in CONTROL_PHASES:
+                game.phase = CONTROL_PHASES[msg_type]
+            elif msg_type == 'quit_to_menu':
+                game.drop_player(msg['by'])
+            elif msg_type == 'round':
+                # SAME SEED + PLAYERS AS THE RECORDING; THE KEYFRAMES THAT FOLLOW
+                # PIN DOWN EVERYTHING THE SEED DOES NOT (E.G. HOST-PICKED FRUIT)
+                game.active = set(msg['players'])
+                game.rng.seed(msg['seed'])
+                game.reset()
+                self.decoders.clear()
+                self.rounds += 1
+            elif msg_type == 'result':
+                replayed = game.winner if game.phase == STATE_GAME_OVER else 'unfinished'
+                self.results.append({'tick': self.tick, 'winner': msg['winner'], 'scores': msg['scores']})
+                if replayed != msg['winner']:
+                    self.mismatches.append({'tick': self.tick, 'recorded': msg['winner'],
+                                            'replayed': replayed})
+
+    def run(self):
+        """Play the whole replay headless; returns summary()."""
+        for _ in self.ticks():
+            pass
+        return self.summary()
+
+    def summary(self):
+        return {'ticks': self.tick, 'rounds': self.rounds, 'results': self.results,
+                'mismatches': self.mismatches}
+
+
+def main(paths):
+    for path in paths:
+        started = time.perf_counter()
+        summary = ReplayPlayer(path).run()
+        elapsed = time.perf_counter() - started
+        summary['path'] = path
+        summary['ticks_per_second'] = round(summary['ticks'] / elapsed) if elapsed else None
+        print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,68 @@
+# ==============================================================================
+# GROUP MEMBERS: Adrian R., Christian V., Kamy A. and Vanessa F.
+# ASGT: Project
+# ORGN: CMPS 3640
+# FILE: test_snake_replay.py
+# DATE:
+# DESCRIPTION: Regression tests for match recording and playback
+#              (python3 -m pytest).
+# ==============================================================================
+
+# === Libraries ===
+from snake_engine import GameState, STATE_RUNNING, STATE_PAUSED, STATE_GAME_OVER
+from snake_replay import ReplayRecorder, ReplayPlayer
+
+WIDTH, HEIGHT, CELL = 200, 200, 10
+
+
+def record_session(path, phases_before_death):
+    """Record one round: a normal tick, then snake 1 parked against the right
+    wall, one tick per phase in phases_before_death, then a running tick
+    on which snake 1 hits the wall."""
+    game = GameState(WIDTH, HEIGHT, CELL, 2)
+    recorder = ReplayRecorder(path, game, tick_rate=10)
+    game.rng.seed(7)
+    game.reset()
+    recorder.new_round(7)
+    recorder.record(game)
+
+    game.phase = STATE_RUNNING
+    game.step()
+    recorder.record(game)
+
+    snake = game.snake(1)
+    y = snake.pos[1]
+    snake.set_body([(WIDTH - CELL * (i + 1), y) for i in range(3)])
+    snake.direction = snake.change_to = 'RIGHT'
+    recorder.record(game)
+
+    for phase in phases_before_death:
+        game.phase = phase
+        recorder.record(game)
+
+    game.phase = STATE_RUNNING
+    assert game.step()
+    recorder.record(game)
+    recorder.close()
+    return game
+
+
+def test_die_on_the_tick_after_resume(tmp_path):
+    path = tmp_path / 'pause.replay'
+    game = record_session(str(path), [STATE_PAUSED, STATE_PAUSED])
+    assert game.phase == STATE_GAME_OVER and game.winner == 2
+
+    player = ReplayPlayer(str(path))
+    summary = player.run()
+    assert summary['mismatches'] == []
+    assert [result['winner'] for result in summary['results']] == [2]
+    assert player.game.phase == STATE_GAME_OVER
+
+
+def test_die_without_a_pause(tmp_path):
+    path = tmp_path / 'plain.replay'
+    record_session(str(path), [])
+
+    summary = ReplayPlayer(str(path)).run()
+    assert summary['mismatches'] == []
+    assert [result['winner'] for result in summary['results']] == [2]